@@ -1,6 +1,7 @@
 import pandas as pd
-from product import Product as P
-import product as p
+import catalog
+from specindex import SpecIndex
+from excelproduct import ExcelProduct
 
 '''index corresponds to graph_objects'''
 OCP_INDEX = 0
@@ -11,8 +12,28 @@ IRL_INDEX = 4
 ORL_INDEX = 5
 RI_INDEX = 6
 
+#where each graph's lines are listed on the MappingLaAm sheet: graph index -> (row, col)
+MAPPING_CELLS = {
+    OCP_INDEX : (10, 0),
+    SSG_INDEX : (10, 10),
+    NF_INDEX : (10, 20),
+    OIP3_INDEX : (20, 0),
+    IRL_INDEX : (20, 10),
+    ORL_INDEX : (20, 20),
+    RI_INDEX : (30, 0),
+}
+
+#spec ranges a search can ask for
+SEARCH_RANGES = [('freq-low', 'freq-high')]
+
+SPECS_FILE = 'data/ampexcels/ampproductspecs.xlsx'
+
 def load_specs():
-    df = pd.read_excel('data/ampexcels/ampproductspecs.xlsx', sheet_name='Sheet1', index_col=0)
+    datasheet = catalog.load_specs('Amplifier', SPECS_FILE)
+    if datasheet is not None:
+        return datasheet
+
+    df = pd.read_excel(SPECS_FILE, sheet_name='Sheet1', index_col=0)
 
     datasheet = {}
 
@@ -31,52 +52,21 @@ def load_specs():
     return datasheet
 
 
-class Amplifier(P):
+class Amplifier(ExcelProduct):
+    mapping_sheet = 'MappingLaAm'
+    mapping_cells = MAPPING_CELLS
 
     def __init__(self, name):
         super().__init__(name)
 
-        self.spreadsheet = 'data/ampexcels/' + P.products[name]['excel'] + '.xlsx'
-        P.data_sheets[self.spreadsheet] = {}
-
-    def load_graph_data(self, graph):
-        if graph in self.data: return
-        if graph == P.graph_options[OCP_INDEX]:
-            self.loaddata(OCP_INDEX, 10, 0)
-        elif graph == P.graph_options[SSG_INDEX]:
-            self.loaddata(SSG_INDEX, 10, 10)
-        elif graph == P.graph_options[NF_INDEX]:
-            self.loaddata(NF_INDEX, 10, 20)
-        elif graph == P.graph_options[OIP3_INDEX]:
-            self.loaddata(OIP3_INDEX, 20, 0)
-        elif graph == P.graph_options[IRL_INDEX]:
-            self.loaddata(IRL_INDEX, 20, 10)
-        elif graph == P.graph_options[ORL_INDEX]:
-            self.loaddata(ORL_INDEX, 20, 20)
-        elif graph == P.graph_options[RI_INDEX]:
-            self.loaddata(RI_INDEX, 30, 0)
-        
-    #load product data for graph
-    def loaddata(self, index, row, col):
-        if 'MappingLODr' in P.data_sheets[self.spreadsheet]:
-            df = P.data_sheets[self.spreadsheet]['MappingLaAm']
-        else:
-            df = pd.read_excel(self.spreadsheet, sheet_name='MappingLaAm', header=None, na_filter=False)
-            P.data_sheets[self.spreadsheet]['MappingLaAm'] = df
-        
-        self.data[P.graph_options[index]] = {}
-        self.linekeys[P.graph_options[index]] = []
-
-        numlines = df.iloc[row-2,col+1]
-        for i in range(numlines):
-            label, xsheet, xaxis, xmin, xmax, ysheet, yaxis, ymin, ymax = p.get_cell_parameters(df,row+i,col)
-            if type(label) == type('string'):
-                data = p.getcelldata(index, self.spreadsheet, xsheet, xaxis, xmin, xmax, ysheet, yaxis, ymin, ymax)
-                self.data[P.graph_options[index]][label] = data
-                self.linekeys[P.graph_options[index]].append(label)
-
-    def load_class_vars():
-        P.graph_options = [
+        self.spreadsheet = 'data/ampexcels/' + self.products[name]['excel'] + '.xlsx'
+        self.source = self.spreadsheet
+
+    #family metadata, loaded once and then only read by every session
+    @classmethod
+    def load_class_vars(cls):
+        if cls.products is not None: return
+        cls.graph_options = [
                 'Output Compression Points',
                 'Small Signal Gain',
                 'Noise Figure',
@@ -86,44 +76,44 @@ class Amplifier(P):
                 'Reverse Isolation',
             ]
 
-        P.graph_labels = {
-            P.graph_options[OCP_INDEX] : {
+        cls.graph_labels = {
+            cls.graph_options[OCP_INDEX] : {
                 'xlabel' : 'Frequency',
                 'ylabel' : 'Output Comp. Points',
                 'xunit' : '(GHz)',
                 'yunit' : '(dBm)',
             },
-            P.graph_options[SSG_INDEX] : {
+            cls.graph_options[SSG_INDEX] : {
                 'xlabel' : 'Frequency',
                 'ylabel' : 'Sm. Signal Gain',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[NF_INDEX] : {
+            cls.graph_options[NF_INDEX] : {
                 'xlabel' : 'Frequency',
                 'ylabel' : 'Noise Figure',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[OIP3_INDEX] : {
+            cls.graph_options[OIP3_INDEX] : {
                 'xlabel' : 'Frequency',
                 'ylabel' : 'OIP3',
                 'xunit' : '(GHz)',
                 'yunit' : '(dBm)',
             },
-            P.graph_options[IRL_INDEX] : {
+            cls.graph_options[IRL_INDEX] : {
                 'xlabel' : 'Frequency',
                 'ylabel' : 'Input Return Loss',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[ORL_INDEX] : {
+            cls.graph_options[ORL_INDEX] : {
                 'xlabel' : 'Frequency',
                 'ylabel' : 'Output Return Loss',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[RI_INDEX] : {
+            cls.graph_options[RI_INDEX] : {
                 'xlabel' : 'Frequency',
                 'ylabel' : 'Reverse Isolation',
                 'xunit' : '(GHz)',
@@ -131,6 +121,9 @@ class Amplifier(P):
             },
         }  
 
-        P.products = load_specs()
+        products = load_specs()
+        cls.spec_index = SpecIndex(products, SEARCH_RANGES)
+        # set last, the family is loaded once products is set
+        cls.products = products
 
 
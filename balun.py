@@ -1,6 +1,9 @@
 import pandas as pd
 from passive import Passive, WrongPassiveException
 from product import Product as P
+import catalog
+from specindex import SpecIndex
+from curve import Curve
 
 '''index corresponds to graph_objects'''
 
@@ -10,8 +13,17 @@ ISO = 'Isolation'
 AMP_B = 'Amplitude Balance'
 PH_B = 'Phase Balance'
 
+#spec ranges a search can ask for
+SEARCH_RANGES = [('freq-low', 'freq-high')]
+
+SPECS_FILE = 'data/balun-files/balunproductspecs.xlsx'
+
 def load_specs():
-    df = pd.read_excel('data/balun-files/balunproductspecs.xlsx', sheet_name='Sheet1', index_col=0)
+    datasheet = catalog.load_specs('Balun', SPECS_FILE)
+    if datasheet is not None:
+        return datasheet
+
+    df = pd.read_excel(SPECS_FILE, sheet_name='Sheet1', index_col=0)
 
     datasheet = {}
 
@@ -28,6 +40,11 @@ def load_specs():
     return datasheet
 
 class Balun(Passive):
+    port_aliases = {'c' : 'commonport', 'a' : 'outport0', 'b' : 'outport180'}
+    metrics = {
+        AMP_B : lambda p: (p.s_db('ca') - p.s_db('cb')) * 10,
+        PH_B : lambda p: p.s_angle('ca') - p.s_angle('cb'),
+    }
 
     def __init__(self, name):
         super().__init__(name, 'balun')
@@ -96,10 +113,13 @@ class Balun(Passive):
         elif graph == PH_B:
             self.get_phasebal_data()
         
-    def load_class_vars():
-        P.graph_options = [RL, ISO, AMP_B, PH_B]
+    #family metadata, loaded once and then only read by every session
+    @classmethod
+    def load_class_vars(cls):
+        if cls.products is not None: return
+        cls.graph_options = [RL, ISO, AMP_B, PH_B]
 
-        P.graph_labels = {
+        cls.graph_labels = {
             RL : {
                 'xlabel' : 'Frequency',
                 'ylabel' : RL,
@@ -132,17 +152,17 @@ class Balun(Passive):
             },
         }  
 
-        P.products = load_specs()
+        products = load_specs()
+        cls.spec_index = SpecIndex(products, SEARCH_RANGES)
+        # set last, the family is loaded once products is set
+        cls.products = products
 
     def get_returnloss_data(self):
         data = dict()
         xdata = self.get_frequency_data()
-        data['Common'] = {'xdata' : xdata,
-                        'ydata' : self.touchstone_data['S' + self.commonport + self.commonport + 'DB']}
-        data['Out 0'] = {'xdata' : xdata,
-                        'ydata' : self.touchstone_data['S' + self.outport0 + self.outport0 + 'DB']}
-        data['Out 180'] = {'xdata' : xdata,
-                        'ydata' : self.touchstone_data['S' + self.outport180 + self.outport180 + 'DB']}
+        data['Common'] = Curve(xdata, self.sparam_db(self.commonport, self.commonport))
+        data['Out 0'] = Curve(xdata, self.sparam_db(self.outport0, self.outport0))
+        data['Out 180'] = Curve(xdata, self.sparam_db(self.outport180, self.outport180))
        
         self.data[RL] = data 
         self.linekeys[RL] = ['Common', 'Out 0', 'Out 180']
@@ -153,47 +173,18 @@ class Balun(Passive):
     def get_isolation_data(self):
         data = dict()
         xdata = self.get_frequency_data()
-        data[ISO] = {'xdata' : xdata, 
-                    'ydata' : self.touchstone_data['S' + self.outport0 + self.outport180 + 'DB']}
+        data[ISO] = Curve(xdata, self.sparam_db(self.outport0, self.outport180))
         self.data[ISO] = data
         self.linekeys[ISO] = [ISO]
 
     def get_amplitudebal_data(self):
-        out0 = self.touchstone_data['S' + self.commonport + self.outport0 + 'DB']
-        out180 = self.touchstone_data['S' + self.commonport + self.outport180 + 'DB']
-        ampbal = []
-        for i in range(len(out0)):
-            ampbal.append((out0[i]-out180[i]) * 10)
-        
         data = dict()
-        xdata = self.get_frequency_data()
-        data[AMP_B] = {'xdata' : xdata,
-                        'ydata' : ampbal}
+        data[AMP_B] = Curve(self.get_frequency_data(), self.metric(AMP_B))
         self.data[AMP_B] = data
         self.linekeys[AMP_B] = [AMP_B]
 
     def get_phasebal_data(self):
-        out0 = self.touchstone_data['S' + self.commonport + self.outport0 + 'A']
-        out180 = self.touchstone_data['S' + self.commonport + self.outport180 + 'A']
-        frequencydata = self.get_frequency_data()
-        xdata = []
-        phasebal = []
-        for i in range(len(out0)):
-            o2 = out180[i]
-            o1 = out0[i]
-            x = frequencydata[i]
-            if (o2 < 0 and o1 < 0) or (o2 > 0 and o1 > 0):
-                phasebal.append(o1 - o2)
-                xdata.append(x)
-            else:
-                phasebal.append(o1 - o2)
-                xdata.append(x)
-        
         data = dict()
-        data[PH_B] = {'xdata' : xdata,
-                        'ydata' : phasebal}
+        data[PH_B] = Curve(self.get_frequency_data(), self.metric(PH_B))
         self.data[PH_B] = data
         self.linekeys[PH_B] = [PH_B]
-
-
-
@@ -0,0 +1,73 @@
+'''
+Payload size of a typical comparison: the mixers found for RF 2-8 GHz, the
+first 5 of them selected, with the default graphs of the mixer tab.
+
+Prints the size of the JSON sent for the table rows and the figures with
+the curve values as plain full precision lists (what plotly's encoder made
+of them before plotdata.py), rounded lists and typed arrays, raw and
+compressed as Flask-Compress does (gzip level 6, brotli quality 4).
+
+    python bench_payload.py
+'''
+
+import json
+import gzip
+import brotli
+import numpy
+import plotly
+import plotdata
+import productsearch as ps
+from mixer import Mixer as M
+
+MIXERS = 5
+
+#curve values as plotly's JSON encoder sends numpy arrays without typed array support
+def plain_array(values):
+    return numpy.asarray(values, dtype=numpy.float64).tolist()
+
+def payload(objects, rows, graphs, inputs):
+    ps.TRACE_CACHE.clear()
+    ps.LAYOUT_CACHE.clear()
+    figures = []
+    for graph in graphs:
+        fig = ps.create_graph(M, objects, graph, inputs)
+        figures.append(fig[0] if isinstance(fig, tuple) else fig)
+    return json.dumps({'table' : rows, 'figures' : figures}, cls=plotly.utils.PlotlyJSONEncoder).encode('utf-8')
+
+def main():
+    low_rf, high_rf, low_lo, high_lo, low_if, high_if, low_lodr, high_lodr = inputs = \
+        ps.mixer_true_input_values(2, 8, None, None, None, None, None, None)
+    low, high = ps.mixer_true_rflo_range(low_rf, high_rf, low_lo, high_lo)
+    ids = [p['id'] for p in ps.search_products(M, inputs)]
+    searched = ps.manage_load(ids, M)
+    rows = ps.m_table_data(searched, 'mn', low, high)
+
+    graphs = M.graph_options[:3]
+    selected = [ps.load_graphs(p, graphs) for p in ps.manage_load(ids[:MIXERS], M)]
+    graph_inputs = (low, high, low_if, high_if)
+
+    encode_array, typed = plotdata.encode_array, plotdata.TYPED
+    variants = []
+    try:
+        plotdata.encode_array = plain_array
+        variants.append(('plain lists', payload(selected, rows, graphs, graph_inputs)))
+        plotdata.encode_array = encode_array
+        plotdata.TYPED = False
+        variants.append(('rounded lists', payload(selected, plotdata.round_rows(rows), graphs, graph_inputs)))
+        plotdata.TYPED = True
+        variants.append(('typed arrays', payload(selected, plotdata.round_rows(rows), graphs, graph_inputs)))
+    finally:
+        plotdata.encode_array, plotdata.TYPED = encode_array, typed
+        ps.TRACE_CACHE.clear()
+
+    print('%i mixers of %i, %i rows, graphs: %s' % (len(selected), len(ids), len(rows), ', '.join(graphs)))
+    print('typed arrays %s for this plotly.js' % ('used' if typed else 'not used'))
+    print('%-16s %12s %12s %12s' % ('encoding', 'json (kB)', 'gzip (kB)', 'br (kB)'))
+    base = len(variants[0][1])
+    for name, data in variants:
+        print('%-16s %12.1f %12.1f %12.1f   %5.1f%% of plain json' % (name, len(data) / 1e3, len(gzip.compress(data, 6)) / 1e3,
+                                                                  len(brotli.compress(data, quality=4)) / 1e3,
+                                                                  100 * len(brotli.compress(data, quality=4)) / base))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+'''
+Benchmark of the bulk touchstone parser against the line by line parser.
+
+Parses every .sNp file under data/*-files with both parsers, checks that
+they produce the same data and prints the time taken per file family.
+
+    python bench_touchstone.py [repeats]
+'''
+
+import sys
+import glob
+import time
+import numpy
+import skrf as rf
+
+def parse_time(path, fast, repeats):
+    best = None
+    for i in range(repeats):
+        start = time.perf_counter()
+        ts = rf.Touchstone(path, fast=fast)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, ts
+
+def same(a, b):
+    return (numpy.array_equal(a.sparameters, b.sparameters)
+            and numpy.array_equal(a.noise, b.noise)
+            and a.comments == b.comments
+            and a.port_names == b.port_names
+            and a.reference == b.reference)
+
+def main(repeats):
+    totals = {}
+    for path in sorted(glob.glob('data/*-files/*.[sS]*[pP]')):
+        family = path.split('/')[1]
+        try:
+            old_time, old = parse_time(path, False, repeats)
+        except Exception as e:
+            print('skipped', path, '(' + type(e).__name__ + ')')
+            continue
+        new_time, new = parse_time(path, True, repeats)
+        if not same(old, new):
+            print('MISMATCH', path)
+        old_total, new_total, count = totals.get(family, (0, 0, 0))
+        totals[family] = (old_total + old_time, new_total + new_time, count + 1)
+
+    print('%-16s %6s %12s %12s %8s' % ('family', 'files', 'lines (ms)', 'bulk (ms)', 'speedup'))
+    all_old, all_new = 0, 0
+    for family, (old_total, new_total, count) in totals.items():
+        print('%-16s %6i %12.1f %12.1f %7.1fx' % (family, count, old_total * 1e3, new_total * 1e3, old_total / new_total))
+        all_old += old_total
+        all_new += new_total
+    print('%-16s %6s %12.1f %12.1f %7.1fx' % ('total', '', all_old * 1e3, all_new * 1e3, all_old / all_new))
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
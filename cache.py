@@ -0,0 +1,224 @@
+'''
+Size-aware LRU cache used for the workbook sheets and the product objects.
+
+Entries are measured in bytes when they are stored (and again on resize),
+the least recently used entries are evicted once the total goes over the
+budget, and hits/misses/evictions are counted for monitoring.
+
+Budgets are given in MB by environment variables, see budget_from_env.
+
+SingleFlight makes concurrent loads of the same key (a product's graph, a
+workbook's sheet) run once, the other callers waiting for its result (at
+most timeout seconds if one is given, a hung load then fails them with
+TimeoutError). do_many loads the keys not in flight in one call (the graphs
+of a product read in one pass) and waits for the others.
+'''
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy
+import pandas as pd
+
+#budget in bytes from an environment variable given in MB
+def budget_from_env(name, default_mb):
+    return int(float(os.environ.get(name, default_mb)) * 2**20)
+
+#approximate memory held by an object
+def nbytes(obj):
+    if isinstance(obj, numpy.memmap):
+        # backed by the page cache, not by this process
+        return 0
+    if isinstance(obj, numpy.ndarray):
+        return obj.nbytes
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if hasattr(obj, 'nbytes') and callable(obj.nbytes):
+        return obj.nbytes()
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(nbytes(k) + nbytes(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(nbytes(v) for v in obj)
+    return sys.getsizeof(obj)
+
+class LRUCache:
+
+    def __init__(self, budget, sizeof=nbytes):
+        self.budget = budget
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        #shared by the threads of a worker, entries are measured outside of it
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    #get an entry and mark it as recently used, default if it is not cached
+    def get(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def __getitem__(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                raise KeyError(key)
+            return self.get(key)
+
+    def __setitem__(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.sizes[key]
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            self.sizes[key] = size
+            self.size += size
+            self.evict()
+
+    #measure an entry again after it grew or shrank
+    def resize(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            return
+        size = self.sizeof(value)
+        with self.lock:
+            if self.entries.get(key) is value:
+                self.size += size - self.sizes[key]
+                self.sizes[key] = size
+                self.evict()
+
+    def pop(self, key, default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.size -= self.sizes.pop(key)
+            return self.entries.pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.size = 0
+
+    #drop least recently used entries until within budget (the newest entry is always kept)
+    def evict(self):
+        with self.lock:
+            while self.size > self.budget and len(self.entries) > 1:
+                key, value = self.entries.popitem(last=False)
+                self.size -= self.sizes.pop(key)
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries' : len(self.entries),
+                'bytes' : self.size,
+                'budget' : self.budget,
+                'hits' : self.hits,
+                'misses' : self.misses,
+                'evictions' : self.evictions,
+            }
+
+class SingleFlight:
+
+    def __init__(self, timeout=None):
+        #key -> call in flight
+        self.calls = {}
+        self.lock = threading.Lock()
+        #seconds a caller waits for the call of another one
+        self.timeout = timeout
+
+    #run fn() for a key, callers arriving while it runs wait and share its result (or its error)
+    def do(self, key, fn):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+        if not leader:
+            return call.wait(self.timeout)
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+    #run fn(keys) once for the keys not in flight, it returns (key -> result, key -> error),
+    #callers of the other keys wait for the calls in flight; returns (key -> result, key -> error) of all keys
+    def do_many(self, keys, fn):
+        calls = {}
+        leading = []
+        with self.lock:
+            for key in keys:
+                call = self.calls.get(key)
+                if call is None:
+                    call = self.calls[key] = Call()
+                    leading.append(key)
+                calls[key] = call
+
+        results, errors = {}, {}
+        if leading:
+            try:
+                results, errors = fn(leading)
+            except Exception as e:
+                errors = dict.fromkeys(leading, e)
+            except BaseException as e:
+                errors = dict.fromkeys(leading, e)
+                raise
+            finally:
+                with self.lock:
+                    for key in leading:
+                        del self.calls[key]
+                for key in leading:
+                    calls[key].result = results.get(key)
+                    calls[key].error = errors.get(key)
+                    calls[key].done.set()
+
+        results, errors = dict(results), dict(errors)
+        for key, call in calls.items():
+            if key in leading:
+                continue
+            try:
+                results[key] = call.wait(self.timeout)
+            except Exception as e:
+                errors[key] = e
+        return results, errors
+
+    #number of keys in flight
+    def __len__(self):
+        return len(self.calls)
+
+class Call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError()
+        if self.error is not None:
+            raise self.error
+        return self.result
@@ -0,0 +1,195 @@
+'''
+Memory-mapped catalog of every product family.
+
+The catalog is one binary file holding the spec sheets of all five families
+and every curve of every product, so the app does not need to read any
+excel or touchstone file to start or to draw a graph. Layout:
+
+    8 bytes     magic (MAGIC)
+    8 bytes     little-endian length of the header
+    header      utf-8 JSON index
+    padding     to an 8 byte boundary
+    values      contiguous float64 curve data
+
+The header maps family -> spec sheet (with the mtime/size of the excel file)
+and family -> product id -> graph -> [label, x offset, x length, y offset, y length]
+(with the mtime/size of the product's source file). The values are opened
+with numpy.memmap, so every gunicorn worker shares the same page cache pages.
+Entries whose source file changed since the build are ignored.
+
+Build (or rebuild) the catalog with:
+
+    python catalog.py
+'''
+
+import os
+import json
+import struct
+import tempfile
+import numpy
+from curve import Curve, to_float_array
+from curvecache import file_stamp
+
+CATALOG_PATH = os.path.join('data', 'catalog.bin')
+MAGIC = b'PSCATLG1'
+
+#set to False to always read the source files (used while building)
+USE_CATALOG = True
+
+#opened catalog: (catalog mtime, header, values)
+OPENED = None
+
+#write a header and float64 values to a blob file
+def write_blob(path, header, values):
+    header = json.dumps(header).encode('utf-8')
+    start = 16 + len(header)
+    padding = b'\0' * (-start % 8)
+    # unique temporary name, several processes may write the same blob
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(padding)
+            f.write(numpy.ascontiguousarray(values, dtype='<f8').tobytes())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        # a full disk (or /dev/shm) must not leave partial files behind
+        os.unlink(tmp)
+        raise
+
+#read the header of a blob file and memory-map its values
+def open_blob(path):
+    with open(path, 'rb') as f:
+        if f.read(8) != MAGIC:
+            raise ValueError('not a catalog file: ' + path)
+        length = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(length).decode('utf-8'))
+    start = 16 + length
+    start += -start % 8
+    if os.path.getsize(path) > start:
+        values = numpy.memmap(path, dtype='<f8', mode='r', offset=start)
+    else:
+        values = numpy.zeros(0)
+    return header, values
+
+#open the catalog (reopened if the file was rebuilt), None if unavailable
+def open_catalog():
+    global OPENED
+    if not USE_CATALOG:
+        return None
+    try:
+        mtime = os.stat(CATALOG_PATH).st_mtime_ns
+    except OSError:
+        return None
+    if OPENED is None or OPENED[0] != mtime:
+        header, values = open_blob(CATALOG_PATH)
+        OPENED = (mtime, header, values)
+    return OPENED[1], OPENED[2]
+
+def is_fresh(path, stamp):
+    try:
+        # stamps read back from the JSON headers are lists
+        return file_stamp(path) == tuple(stamp)
+    except OSError:
+        return False
+
+#get the spec sheet of a family, None if not in the catalog or stale
+def load_specs(family, specs_file):
+    opened = open_catalog()
+    if opened is None:
+        return None
+    header, values = opened
+    entry = header['specs'].get(family)
+    if entry is None or entry['file'] != specs_file or not is_fresh(specs_file, entry['stamp']):
+        return None
+    return entry['products']
+
+#get (data, linekeys) of a product's graph, None if not in the catalog or stale
+def load_graph(product, graph):
+    opened = open_catalog()
+    if opened is None or product.source is None:
+        return None
+    header, values = opened
+    entry = header['products'].get(type(product).__name__, {}).get(product.name)
+    if (entry is None or graph not in entry['graphs'] or entry['source'] != product.source
+            or not is_fresh(product.source, entry['stamp'])):
+        return None
+
+    data = {}
+    linekeys = []
+    for label, xoffset, xlength, yoffset, ylength in entry['graphs'][graph]:
+        data[label] = Curve(values[xoffset:xoffset + xlength], values[yoffset:yoffset + ylength], numpy.float64)
+        linekeys.append(label)
+    return data, linekeys
+
+#spec values as plain python values for the JSON header
+def to_json_value(v):
+    if isinstance(v, numpy.generic):
+        return v.item()
+    return v
+
+def build(path=CATALOG_PATH):
+    global USE_CATALOG
+    import mixer, amplifier, powerdivider, coupler, balun
+
+    families = [
+        (mixer.Mixer, mixer.SPECS_FILE),
+        (amplifier.Amplifier, amplifier.SPECS_FILE),
+        (powerdivider.PowerDivider, powerdivider.SPECS_FILE),
+        (coupler.Coupler, coupler.SPECS_FILE),
+        (balun.Balun, balun.SPECS_FILE),
+    ]
+
+    USE_CATALOG = False
+    header = {'specs' : {}, 'products' : {}}
+    chunks = []
+    offset = 0
+    for family, specs_file in families:
+        name = family.__name__
+        family.load_class_vars()
+        header['specs'][name] = {
+            'file' : specs_file,
+            'stamp' : file_stamp(specs_file),
+            'products' : {str(id) : {k : to_json_value(v) for k, v in sheet.items()}
+                          for id, sheet in family.products.items()},
+        }
+        header['products'][name] = {}
+
+        for id in family.products:
+            try:
+                product = family(id)
+            except Exception as e:
+                print('skipped', name, id, '(' + type(e).__name__ + ')')
+                continue
+            if product.source is None or not os.path.exists(product.source):
+                print('missing', name, id)
+                continue
+            print('adding', name, id)
+            entry = {'source' : product.source, 'stamp' : file_stamp(product.source), 'graphs' : {}}
+            errors = product.load_graphs(family.graph_options)
+            for graph in family.graph_options:
+                if graph in errors:
+                    print('  skipped', graph, '(' + type(errors[graph]).__name__ + ')')
+                    continue
+                if graph not in product.data:
+                    continue
+                lines = []
+                for label in product.linekeys[graph]:
+                    x = to_float_array(product.data[graph][label].x)
+                    y = to_float_array(product.data[graph][label].y)
+                    lines.append([label, offset, len(x), offset + len(x), len(y)])
+                    chunks += [x, y]
+                    offset += len(x) + len(y)
+                entry['graphs'][graph] = lines
+            header['products'][name][str(id)] = entry
+
+    values = numpy.concatenate(chunks) if chunks else numpy.zeros(0)
+    write_blob(path, header, values)
+    USE_CATALOG = True
+    print('wrote', path, len(values), 'values')
+
+if __name__ == '__main__':
+    build()
@@ -1,6 +1,9 @@
 import pandas as pd
 from passive import Passive, WrongPassiveException
 from product import Product as P
+import catalog
+from specindex import SpecIndex
+from curve import Curve
 
 '''index corresponds to graph_objects'''
 RL = 'Return Loss'
@@ -8,8 +11,17 @@ IL = 'Insertion Loss'
 DIR = 'Directivity'
 CR = 'Coupled Ratio'
 
+#spec ranges a search can ask for
+SEARCH_RANGES = [('freq-low', 'freq-high')]
+
+SPECS_FILE = 'data/coupler-files/couplerproductspecs.xlsx'
+
 def load_specs():
-    df = pd.read_excel('data/coupler-files/couplerproductspecs.xlsx', sheet_name='Sheet1', index_col=0)
+    datasheet = catalog.load_specs('Coupler', SPECS_FILE)
+    if datasheet is not None:
+        return datasheet
+
+    df = pd.read_excel(SPECS_FILE, sheet_name='Sheet1', index_col=0)
 
     datasheet = {}
 
@@ -29,6 +41,11 @@ def load_specs():
     return datasheet
 
 class Coupler(Passive):
+    port_aliases = {'c' : 'coupledport', 'i' : 'inport', 'o' : 'outport'}
+    metrics = {
+        DIR : lambda p: -(p.s_db('ci') - p.s_db('co')),
+        CR : lambda p: p.s_db('ci') - p.s_db('oi'),
+    }
 
     def __init__(self, name):
         Passive.__init__(self, name, 'coupler')
@@ -94,10 +111,13 @@ class Coupler(Passive):
         elif graph == CR:
             self.get_coupledratio_data()
 
-    def load_class_vars():
-        P.graph_options = [RL,IL,DIR,CR]
+    #family metadata, loaded once and then only read by every session
+    @classmethod
+    def load_class_vars(cls):
+        if cls.products is not None: return
+        cls.graph_options = [RL,IL,DIR,CR]
 
-        P.graph_labels = {
+        cls.graph_labels = {
             RL : {
                 'xlabel': 'Frequency',
                 'xunit': '(GHz)',
@@ -124,17 +144,17 @@ class Coupler(Passive):
             },
         }  
 
-        P.products = load_specs()
+        products = load_specs()
+        cls.spec_index = SpecIndex(products, SEARCH_RANGES)
+        # set last, the family is loaded once products is set
+        cls.products = products
 
     def get_returnloss_data(self):
         data = dict()
         xdata = self.get_frequency_data()
-        data['Coupled'] = {'xdata' : xdata,
-                            'ydata' : self.touchstone_data['S' + self.coupledport + self.coupledport + 'DB']}
-        data['Input'] = {'xdata' : xdata,
-                            'ydata' : self.touchstone_data['S' + self.inport + self.inport + 'DB']}
-        data['Output'] = {'xdata' : xdata,
-                            'ydata' : self.touchstone_data['S' + self.outport + self.outport + 'DB']}
+        data['Coupled'] = Curve(xdata, self.sparam_db(self.coupledport, self.coupledport))
+        data['Input'] = Curve(xdata, self.sparam_db(self.inport, self.inport))
+        data['Output'] = Curve(xdata, self.sparam_db(self.outport, self.outport))
         
         self.data[RL] = data
         self.linekeys[RL] = ['Coupled', 'Input', 'Output']
@@ -142,36 +162,18 @@ class Coupler(Passive):
     def get_insertionloss_data(self):
         data = dict()
         xdata = self.get_frequency_data()
-        data[IL] = {'xdata' : xdata,
-                    'ydata' : self.touchstone_data['S' + self.outport + self.inport + 'DB']}
+        data[IL] = Curve(xdata, self.sparam_db(self.outport, self.inport))
         self.data[IL] = data
         self.linekeys[IL] = [IL]
 
     def get_directivity_data(self):
-        coupling_ratio = self.touchstone_data['S' + self.coupledport + self.inport + 'DB']
-        isolation = self.touchstone_data['S' + self.coupledport + self.outport + 'DB']
-        directivity = []
-        for i in range(len(coupling_ratio)):
-            directivity.append((coupling_ratio[i] - isolation[i]) * -1)
-
         data = dict()
-        data[DIR] = {'xdata' : self.get_frequency_data(),
-                        'ydata' : directivity}
+        data[DIR] = Curve(self.get_frequency_data(), self.metric(DIR))
         self.data[DIR] = data
         self.linekeys[DIR] = [DIR]
 
     def get_coupledratio_data(self):
-        coupled_il = self.touchstone_data['S' + self.coupledport + self.inport + 'DB']
-        insertion_loss = self.touchstone_data['S' + self.outport + self.inport + 'DB']
-        coupled_ratio = []
-        for i in range(len(coupled_il)):
-            coupled_ratio.append((coupled_il[i] - insertion_loss[i]))
-        
         data = dict()
-        data[CR] = {'xdata' : self.get_frequency_data(),
-                        'ydata' : coupled_ratio}
+        data[CR] = Curve(self.get_frequency_data(), self.metric(CR))
         self.data[CR] = data
         self.linekeys[CR] = [CR]
-
-
-
@@ -0,0 +1,129 @@
+'''
+A plotted line: x and y values as contiguous NumPy arrays.
+
+Curves replace the {'xdata' : list, 'ydata' : list} dicts; they still answer
+curve['xdata'] / curve['ydata'] (and iterate over those two keys) so code
+written for the dicts keeps working, while the hot paths use curve.x and
+curve.y directly. Arrays already of the right dtype are kept as they are,
+so curves built on memory-mapped values or on a shared frequency axis do
+not copy them.
+
+Values are float64, PRODUCTSEARCH_CURVE_DTYPE=float32 halves the memory of
+the curves read from excel and touchstone files.
+
+For plotting, a curve longer than PYRAMID_MIN_POINTS keeps a pyramid of
+decimations built when it is loaded: level k keeps the min and the max of
+every bucket of 2**(k+1) points, so it has about n / 2**k points and still
+shows every peak and notch. curve.decimated() picks the coarsest level that
+still has enough points in the visible x window.
+'''
+
+import os
+import numpy
+from numbers import Number
+from cache import nbytes
+
+CURVE_DTYPE = numpy.dtype(os.environ.get('PRODUCTSEARCH_CURVE_DTYPE', 'float64'))
+
+KEYS = ('xdata', 'ydata')
+
+#curves up to this many points are always drawn in full
+PYRAMID_MIN_POINTS = int(os.environ.get('PRODUCTSEARCH_PYRAMID_MIN_POINTS', 512))
+
+#cell values to float64, blank cells become NaN
+def to_float_array(values):
+    try:
+        return numpy.asarray(values, dtype=numpy.float64)
+    except (TypeError, ValueError):
+        return numpy.array([v if isinstance(v, Number) else numpy.nan for v in values], dtype=numpy.float64)
+
+#min and max of every bucket of points, in curve order, with the first and last points
+def decimate(x, y, bucket):
+    n = len(y)
+    padded = -(-n // bucket) * bucket
+    values = numpy.full(padded, numpy.nan)
+    values[:n] = y
+    nan = numpy.isnan(values)
+    # NaN values are only picked from buckets without any other value
+    lows = numpy.where(nan, numpy.inf, values).reshape(-1, bucket).argmin(axis=1)
+    highs = numpy.where(nan, -numpy.inf, values).reshape(-1, bucket).argmax(axis=1)
+    starts = numpy.arange(0, padded, bucket)
+    picks = numpy.unique(numpy.concatenate(([0, n - 1], starts + lows, starts + highs)))
+    picks = picks[picks < n]
+    return x[picks], y[picks]
+
+#values as an array of the curve dtype, without a copy when they already are
+def as_curve_array(values, dtype=None):
+    dtype = dtype or CURVE_DTYPE
+    if isinstance(values, numpy.ndarray) and values.dtype == dtype:
+        return values
+    return to_float_array(values).astype(dtype, copy=False)
+
+class Curve:
+    __slots__ = ('x', 'y', 'pyramid')
+
+    def __init__(self, x, y, dtype=None):
+        self.x = as_curve_array(x, dtype)
+        self.y = as_curve_array(y, dtype)
+        #[(x, y)] from full resolution to the coarsest level, built by build_pyramid
+        self.pyramid = None
+
+    def build_pyramid(self):
+        if self.pyramid is None:
+            x, y = self.x[:len(self.y)], self.y[:len(self.x)]
+            levels = [(x, y)]
+            bucket = 4
+            while len(y) > PYRAMID_MIN_POINTS and len(y) // (bucket // 2) >= PYRAMID_MIN_POINTS // 2:
+                levels.append(decimate(x, y, bucket))
+                bucket *= 2
+            self.pyramid = levels
+        return self.pyramid
+
+    #pyramid level of the coarsest decimation with at least points points in [xlow, xhigh]
+    #(in the whole curve if they are not given)
+    def level(self, points, xlow=None, xhigh=None):
+        levels = self.build_pyramid()
+        x = levels[0][0]
+        visible = len(x)
+        if xlow is not None and xhigh is not None:
+            visible = numpy.count_nonzero((x >= xlow) & (x <= xhigh))
+        level = 0
+        while level + 1 < len(levels) and visible // 2**(level + 1) >= points:
+            level += 1
+        return level
+
+    #(x, y) of the decimation chosen by level()
+    def decimated(self, points, xlow=None, xhigh=None):
+        return self.build_pyramid()[self.level(points, xlow, xhigh)]
+
+    def __getitem__(self, key):
+        if key == 'xdata':
+            return self.x
+        if key == 'ydata':
+            return self.y
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(KEYS)
+
+    def __contains__(self, key):
+        return key in KEYS
+
+    def keys(self):
+        return list(KEYS)
+
+    def values(self):
+        return [self.x, self.y]
+
+    def items(self):
+        return [('xdata', self.x), ('ydata', self.y)]
+
+    #memory held by the arrays and the pyramid (memory-mapped ones are not counted)
+    def nbytes(self):
+        total = nbytes(self.x) + nbytes(self.y)
+        if self.pyramid is not None:
+            total += sum(x.nbytes + y.nbytes for x, y in self.pyramid[1:])
+        return total
+
+    def __repr__(self):
+        return 'Curve(%i points)' % len(self.x)
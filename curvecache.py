@@ -0,0 +1,152 @@
+'''
+Compiled curve cache for the excel based products (Mixers, Amplifiers).
+
+Reading a measurement workbook through pandas takes seconds, so every graph
+referenced by a workbook's mapping sheet is extracted once and written to a
+.npz sidecar under CACHE_DIR, keyed by graph and line label. A sidecar
+remembers the mtime, size and hash of the workbook it was compiled from and
+is ignored as soon as the workbook changes, in which case the products fall
+back to reading the excel file.
+
+Compile (or refresh) the sidecars of every mixer and amplifier with:
+
+    python curvecache.py [--force]
+'''
+
+import os
+import sys
+import json
+import hashlib
+import numpy
+from curve import Curve, to_float_array
+
+CACHE_DIR = os.path.join('data', 'cache')
+
+#sidecar index per sidecar path: (sidecar mtime, index)
+INDEXES = {}
+#workbooks whose hash matched their sidecar after an mtime change: excel -> (mtime, size)
+VERIFIED = {}
+
+#location of the sidecar compiled from an excel workbook
+def sidecar_path(excel):
+    family = os.path.basename(os.path.dirname(excel))
+    name = os.path.splitext(os.path.basename(excel))[0]
+    return os.path.join(CACHE_DIR, family, name + '.npz')
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+#(mtime, size) of a file, what tells the caches that it changed
+def file_stamp(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+#read the index of a sidecar, None if it does not exist
+def read_index(excel):
+    path = sidecar_path(excel)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if path in INDEXES and INDEXES[path][0] == mtime:
+        return INDEXES[path][1]
+    with numpy.load(path) as npz:
+        index = json.loads(str(npz['index']))
+    INDEXES[path] = (mtime, index)
+    return index
+
+#sidecar is usable if the workbook is unchanged (same mtime/size, or same content)
+def is_fresh(excel, index):
+    if index is None:
+        return False
+    try:
+        mtime, size = file_stamp(excel)
+    except OSError:
+        return False
+    if mtime == index['mtime'] and size == index['size']:
+        return True
+    if size != index['size']:
+        return False
+    if VERIFIED.get(excel) == (mtime, size):
+        return True
+    if file_hash(excel) == index['hash']:
+        VERIFIED[excel] = (mtime, size)
+        return True
+    return False
+
+#get (data, linekeys) of a graph from the sidecar, None if missing or stale
+def load_graph(excel, graph):
+    index = read_index(excel)
+    if not is_fresh(excel, index) or graph not in index['graphs']:
+        return None
+
+    data = {}
+    linekeys = []
+    with numpy.load(sidecar_path(excel)) as npz:
+        for label, key in index['graphs'][graph]:
+            data[label] = Curve(npz[key + 'x'], npz[key + 'y'])
+            linekeys.append(label)
+    return data, linekeys
+
+#write the loaded graphs of a product object to its workbook's sidecar
+def write_sidecar(excel, data, linekeys):
+    mtime, size = file_stamp(excel)
+    index = {
+        'mtime' : mtime,
+        'size' : size,
+        'hash' : file_hash(excel),
+        'graphs' : {},
+    }
+    arrays = {}
+    for g, graph in enumerate(data):
+        lines = []
+        for l, label in enumerate(linekeys[graph]):
+            key = 'g%il%i' % (g, l)
+            arrays[key + 'x'] = to_float_array(data[graph][label].x)
+            arrays[key + 'y'] = to_float_array(data[graph][label].y)
+            lines.append((label, key))
+        index['graphs'][graph] = lines
+    arrays['index'] = numpy.array(json.dumps(index))
+
+    path = sidecar_path(excel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp.npz'
+    numpy.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+#load every graph of a product from excel and compile its sidecar
+def compile_product(product, graphs):
+    errors = product.load_graphs(graphs)
+    for graph, e in errors.items():
+        print('  skipped', graph, '(' + type(e).__name__ + ')')
+    write_sidecar(product.spreadsheet, product.data, product.linekeys)
+
+def compile_all(force=False):
+    from mixer import Mixer
+    from amplifier import Amplifier
+
+    for family in (Mixer, Amplifier):
+        family.load_class_vars()
+        compiled = set()
+        for name in family.products:
+            product = family(name)
+            excel = product.spreadsheet
+            if excel in compiled:
+                continue
+            compiled.add(excel)
+            if not os.path.exists(excel):
+                print('missing', excel)
+                continue
+            if not force and is_fresh(excel, read_index(excel)):
+                continue
+            print('compiling', excel)
+            if force and os.path.exists(sidecar_path(excel)):
+                os.remove(sidecar_path(excel))
+            compile_product(product, family.graph_options)
+
+if __name__ == '__main__':
+    compile_all(force='--force' in sys.argv[1:])
@@ -0,0 +1,121 @@
+'''
+Windowed statistics index for a single curve.
+
+Built the first time a search needs the statistics of a curve (curves that
+are only plotted never get one), it answers min/max/median of the y values
+whose x lies in [xlow, xhigh] without scanning the curve (points without a
+y value are left out, as numpy.nanmin/nanmax/nanmedian do):
+
+    - the points are sorted by x, window bounds come from numpy.searchsorted
+    - a sparse table gives the range min/max in O(1)
+    - a wavelet matrix over the y ranks gives the range k-th smallest value
+      (and so the median) in O(log n)
+
+The sorted points are kept, the tables are only built on the first range
+query.
+'''
+
+import numpy
+from curve import to_float_array
+
+class CurveIndex:
+
+    def __init__(self, xdata, ydata):
+        x = to_float_array(xdata)
+        y = to_float_array(ydata)
+        x, y = x[:len(y)], y[:len(x)]
+        # blank cells are not values, they count neither as the median nor as a point of the window
+        keep = ~(numpy.isnan(x) | numpy.isnan(y))
+        x, y = x[keep], y[keep]
+        order = numpy.argsort(x, kind='stable')
+        self.x = x[order]
+        self.y = y[order]
+        #(mins, maxs, sorted_y, levels), built on the first range query
+        self.tables = None
+
+    #sparse tables and wavelet matrix of the curve, built once
+    def build_tables(self):
+        if self.tables is not None:
+            return self.tables
+        n = len(self.y)
+
+        # sparse tables: level j holds min/max of y[i:i + 2**j]
+        mins = [self.y]
+        maxs = [self.y]
+        width = 1
+        while width * 2 <= n:
+            mins.append(numpy.fmin(mins[-1][:-width], mins[-1][width:]))
+            maxs.append(numpy.fmax(maxs[-1][:-width], maxs[-1][width:]))
+            width *= 2
+
+        # wavelet matrix over the rank of every y value (ranks are 0..n-1)
+        by_value = numpy.argsort(self.y, kind='stable')
+        sorted_y = self.y[by_value]
+        ranks = numpy.empty(n, dtype=numpy.int64)
+        ranks[by_value] = numpy.arange(n)
+        levels = []
+        for bit in range(max(n - 1, 1).bit_length() - 1, -1, -1):
+            ones = (ranks >> bit) & 1 == 1
+            zeros_before = numpy.concatenate(([0], numpy.cumsum(~ones)))
+            levels.append((bit, zeros_before, zeros_before[-1]))
+            ranks = numpy.concatenate((ranks[~ones], ranks[ones]))
+
+        # set whole, a concurrent query builds its own copy or sees the complete tables
+        self.tables = (mins, maxs, sorted_y, levels)
+        return self.tables
+
+    def __len__(self):
+        return len(self.y)
+
+    #memory held by the index arrays (and the tables once built)
+    def nbytes(self):
+        total = self.x.nbytes + self.y.nbytes
+        if self.tables is not None:
+            mins, maxs, sorted_y, levels = self.tables
+            total += sorted_y.nbytes + sum(a.nbytes for a in mins[1:] + maxs[1:]) + sum(level[1].nbytes for level in levels)
+        return total
+
+    #index range [lo, hi) of the points with xlow <= x <= xhigh
+    def window(self, xlow, xhigh):
+        lo = int(numpy.searchsorted(self.x, xlow, side='left'))
+        hi = int(numpy.searchsorted(self.x, xhigh, side='right'))
+        return lo, max(lo, hi)
+
+    def range_min(self, lo, hi):
+        j = (hi - lo).bit_length() - 1
+        mins = self.build_tables()[0]
+        return min(mins[j][lo], mins[j][hi - 2 ** j])
+
+    def range_max(self, lo, hi):
+        j = (hi - lo).bit_length() - 1
+        maxs = self.build_tables()[1]
+        return max(maxs[j][lo], maxs[j][hi - 2 ** j])
+
+    #k-th smallest (0 based) y value of the points lo..hi-1
+    def range_kth(self, lo, hi, k):
+        mins, maxs, sorted_y, levels = self.build_tables()
+        rank = 0
+        for bit, zeros_before, total_zeros in levels:
+            zlo, zhi = zeros_before[lo], zeros_before[hi]
+            if k < zhi - zlo:
+                lo, hi = zlo, zhi
+            else:
+                k -= zhi - zlo
+                lo, hi = total_zeros + lo - zlo, total_zeros + hi - zhi
+                rank |= 1 << bit
+        return sorted_y[rank]
+
+    def range_median(self, lo, hi):
+        count = hi - lo
+        if count % 2 == 0:
+            return (self.range_kth(lo, hi, count // 2 - 1) + self.range_kth(lo, hi, count // 2)) / 2
+        return self.range_kth(lo, hi, count // 2)
+
+    #min, max and median of the y values with xlow <= x <= xhigh, None if there are none
+    def stats(self, xlow, xhigh):
+        lo, hi = self.window(xlow, xhigh)
+        if lo == hi:
+            return None
+        return (float(self.range_min(lo, hi)),
+                float(self.range_max(lo, hi)),
+                float(self.range_median(lo, hi)))
@@ -0,0 +1,142 @@
+'''
+Excel Products keep their curves in a workbook. A mapping sheet of the
+workbook lists, for every graph, the lines to plot and where their values
+are: label, x sheet, x column, first and last x row, and the same for y.
+
+The mapping sheet is parsed once per workbook into a MappingIndex (parsed
+again once the workbook changes, the indexes are kept in a size bounded LRU,
+PRODUCTSEARCH_MAPPING_CACHE_MB), and the graphs are loaded from it with one bulk read per data sheet (see
+product.ExcelReader), as float64 arrays.
+
+Excel Products: Mixers, Amplifiers
+'''
+
+import pandas as pd
+import curvecache as cc
+import product as p
+from product import Product
+from cache import LRUCache, SingleFlight, budget_from_env, nbytes
+from curve import Curve
+
+class MappingIndex:
+
+    #cells: graph -> (row, col) of the graph's block on the mapping sheet
+    def __init__(self, df, cells):
+        #graph -> [(label, xsheet, xcol, (xstart, xstop), ysheet, ycol, (ystart, ystop))]
+        self.graphs = {}
+        #graph -> error raised while reading its block
+        self.errors = {}
+        for graph, (row, col) in cells.items():
+            try:
+                self.graphs[graph] = self.read_block(df, row, col)
+            except Exception as e:
+                self.errors[graph] = e
+
+    def read_block(self, df, row, col):
+        lines = []
+        numlines = df.iloc[row-2,col+1]
+        for i in range(numlines):
+            label, xsheet, xaxis, xmin, xmax, ysheet, yaxis, ymin, ymax = p.get_cell_parameters(df,row+i,col)
+            if type(label) == type('string'):
+                lines.append((label, xsheet, p.column_index(xaxis), (xmin-1, xmax),
+                              ysheet, p.column_index(yaxis), (ymin-1, ymax)))
+        return lines
+
+    def __contains__(self, graph):
+        return graph in self.graphs or graph in self.errors
+
+    def nbytes(self):
+        return nbytes(self.graphs) + nbytes(self.errors)
+
+    #lines of a graph, raises the error met while reading its block
+    def lines(self, graph):
+        if graph in self.errors:
+            raise self.errors[graph]
+        return self.graphs[graph]
+
+class ExcelProduct(Product):
+    #mapping sheet name and graph index -> (row, col) of its block, set by subclasses
+    mapping_sheet = None
+    mapping_cells = None
+
+    #(workbook, mapping sheet, workbook mtime/size) -> MappingIndex
+    mapping_indexes = LRUCache(budget_from_env('PRODUCTSEARCH_MAPPING_CACHE_MB', 8))
+    mapping_builds = SingleFlight(p.LOAD_TIMEOUT)
+
+    def __init__(self, name):
+        Product.__init__(self, name)
+        self.spreadsheet = None
+
+    #mapping index of the product's workbook, built on first use and again once the workbook changes
+    def mapping_index(self):
+        key = (self.spreadsheet, self.mapping_sheet) + cc.file_stamp(self.spreadsheet)
+        mapping = ExcelProduct.mapping_indexes.get(key)
+        if mapping is None:
+            mapping = ExcelProduct.mapping_builds.do(key, lambda: self.build_mapping_index(key))
+        return mapping
+
+    def build_mapping_index(self, key):
+        df = pd.read_excel(self.spreadsheet, sheet_name=self.mapping_sheet, header=None, na_filter=False)
+        cells = {self.graph_options[index] : cell for index, cell in self.mapping_cells.items()}
+        mapping = MappingIndex(df, cells)
+        ExcelProduct.mapping_indexes[key] = mapping
+        return mapping
+
+    def load_graph_data(self, graph):
+        if graph in self.data: return
+        errors = self.load_graphs([graph])
+        if graph in errors:
+            raise errors[graph]
+
+    #load several graphs with one read per data sheet, returns graph -> error for the graphs that failed
+    def load_graphs(self, graphs):
+        errors = {}
+        wanted = {}
+        for graph in graphs:
+            if graph in self.data:
+                continue
+            cached = cc.load_graph(self.spreadsheet, graph)
+            if cached is not None:
+                self.data[graph], self.linekeys[graph] = cached
+                continue
+            mapping = self.mapping_index()
+            if graph not in mapping:
+                continue
+            try:
+                wanted[graph] = mapping.lines(graph)
+            except Exception as e:
+                errors[graph] = e
+
+        # every range needed from each sheet, in first use order
+        sheet_ranges = {}
+        for lines in wanted.values():
+            for label, xsheet, xcol, xrows, ysheet, ycol, yrows in lines:
+                sheet_ranges.setdefault(xsheet, {})[(xcol,) + xrows] = None
+                sheet_ranges.setdefault(ysheet, {})[(ycol,) + yrows] = None
+
+        values = {}
+        sheet_errors = {}
+        with p.ExcelReader(self.spreadsheet) as reader:
+            for sheet, ranges in sheet_ranges.items():
+                try:
+                    read = reader.read_ranges(sheet, list(ranges))
+                except Exception as e:
+                    sheet_errors[sheet] = e
+                    continue
+                for r, v in zip(ranges, read):
+                    values[(sheet,) + r] = v
+
+        for graph, lines in wanted.items():
+            graph_data = {}
+            linekeys = []
+            for label, xsheet, xcol, xrows, ysheet, ycol, yrows in lines:
+                if xsheet in sheet_errors or ysheet in sheet_errors:
+                    errors[graph] = sheet_errors.get(xsheet, sheet_errors.get(ysheet))
+                    break
+                graph_data[label] = Curve(values[(xsheet, xcol) + xrows], values[(ysheet, ycol) + yrows])
+                linekeys.append(label)
+            else:
+                # set whole, so other threads never see a partly loaded graph
+                self.data[graph] = graph_data
+                self.linekeys[graph] = linekeys
+        return errors
@@ -0,0 +1,166 @@
+'''
+Concurrent and background loading of product objects and curves.
+
+The objects and graphs a callback needs are loaded on a bounded thread pool
+(the work is mostly file reads and parsing), each product with its own
+timeout. A product that fails or times out is left out instead of failing
+the whole request, and results come back in the order they were asked for.
+
+When a search completes, the graphs the user is about to look at (the
+active graphs of the first rows of the table, in its sort order) are loaded
+by a small thread pool while the user picks rows. The graphs of a product
+are loaded together (one pass over each sheet of its workbook), a graph is
+queued once however many searches ask for it, and a foreground request
+either waits for a load already running or takes over (cancels) one still
+queued and loads it itself. A new search cancels the queued loads of the previous search of
+the same session only, the ones other sessions asked for carry on.
+
+    PRODUCTSEARCH_LOAD_WORKERS      threads loading the products of a request
+    PRODUCTSEARCH_LOAD_TIMEOUT      seconds a product may take to load (from when its load starts),
+                                    and to wait for a load to start or for the same load in another request
+    PRODUCTSEARCH_PREFETCH_WORKERS  threads of the prefetch pool (0 disables prefetching)
+    PRODUCTSEARCH_PREFETCH_ROWS     rows prefetched after a search
+'''
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LOAD_WORKERS = int(os.environ.get('PRODUCTSEARCH_LOAD_WORKERS', 8))
+LOAD_TIMEOUT = float(os.environ.get('PRODUCTSEARCH_LOAD_TIMEOUT', 30))
+PREFETCH_WORKERS = int(os.environ.get('PRODUCTSEARCH_PREFETCH_WORKERS', 2))
+PREFETCH_ROWS = int(os.environ.get('PRODUCTSEARCH_PREFETCH_ROWS', 8))
+
+LOAD_POOL = ThreadPoolExecutor(LOAD_WORKERS, thread_name_prefix='load')
+
+#run task(item) for every item on the load pool, each item's timeout starts when its task does
+#and items not started timeout seconds after the call are dropped, so it returns within twice timeout
+#returns [(item, result)] in item order, without the items that failed, took over timeout seconds or never started
+def load_all(task, items, timeout=LOAD_TIMEOUT):
+    items = list(items)
+    deadline = time.monotonic() + timeout
+    starts = [None] * len(items)
+    started = [threading.Event() for item in items]
+
+    def run(i):
+        starts[i] = time.monotonic()
+        started[i].set()
+        return task(items[i])
+
+    futures = [LOAD_POOL.submit(run, i) for i in range(len(items))]
+    results = []
+    try:
+        for i, (item, future) in enumerate(zip(items, futures)):
+            try:
+                # a task still queued at the deadline waits behind loads that hang (they keep their
+                # threads), it is dropped rather than waited for
+                if not started[i].wait(max(0, deadline - time.monotonic())):
+                    if future.cancel():
+                        raise TimeoutError()
+                    started[i].wait()
+                result = future.result(max(0, starts[i] + timeout - time.monotonic()))
+            except Exception as e:
+                print('failed to load', getattr(item, 'name', item), '(' + type(e).__name__ + ')')
+                continue
+            results.append((item, result))
+    finally:
+        # nothing waits for the tasks that have not started any more
+        for future in futures:
+            future.cancel()
+    return results
+
+#key of a product's graph, the same for every object of the product
+def graph_key(product, graph):
+    return (type(product).__name__, product.name, graph)
+
+class Prefetcher:
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max(workers, 1), thread_name_prefix='prefetch')
+        #graph key -> future of the queued or running load (of all the graphs of the product it loads)
+        self.inflight = {}
+        #graph key -> sessions that asked for the load
+        self.owners = {}
+        self.lock = threading.Lock()
+
+    #queue the loading of the graphs of products for a session, in order, one load per product
+    def prefetch(self, products, graphs, owner=None):
+        if self.workers <= 0:
+            return
+        queued = []
+        with self.lock:
+            for p in products:
+                missing = []
+                for graph in graphs:
+                    key = graph_key(p, graph)
+                    if graph in p.linekeys:
+                        continue
+                    self.owners.setdefault(key, set()).add(owner)
+                    if key not in self.inflight:
+                        missing.append(graph)
+                if not missing:
+                    continue
+                future = self.pool.submit(p.fetch_graphs, missing)
+                keys = [graph_key(p, graph) for graph in missing]
+                for key in keys:
+                    self.inflight[key] = future
+                queued.append((keys, future))
+        # outside the lock, the callback of a load already done runs right away
+        for keys, future in queued:
+            future.add_done_callback(lambda f, keys=keys: self.done(keys, f))
+
+    def done(self, keys, future):
+        with self.lock:
+            for key in keys:
+                if self.inflight.get(key) is future:
+                    del self.inflight[key]
+                    self.owners.pop(key, None)
+
+    #drop the queued loads of a session that have not started (and that no other session asked for)
+    def cancel(self, owner=None):
+        with self.lock:
+            for key in self.inflight:
+                self.owners.get(key, set()).discard(owner)
+            # a load is dropped once none of its graphs is wanted
+            wanted = {id(future) for key, future in self.inflight.items() if self.owners.get(key)}
+            orphans = {id(future) : future for future in self.inflight.values() if id(future) not in wanted}
+            orphans = list(orphans.values())
+        # outside the lock, a cancelled future calls done() right away
+        for future in orphans:
+            future.cancel()
+
+    #make sure graphs of a product are loaded: wait for running loads, take over queued ones
+    #returns graph -> error for the graphs that failed
+    def wait(self, product, graphs, timeout=None):
+        with self.lock:
+            futures = {id(future) : future for future in
+                       (self.inflight.get(graph_key(product, graph)) for graph in graphs) if future is not None}
+        for future in futures.values():
+            if not future.cancel():
+                try:
+                    future.result(timeout)
+                except Exception:
+                    # a failed load is tried again below, and fails in the foreground
+                    pass
+        return product.fetch_graphs(graphs)
+
+PREFETCHER = Prefetcher(PREFETCH_WORKERS)
+
+#load graphs of a product (waiting for prefetched ones), a graph that fails is skipped
+def load_graphs(product, graphs):
+    for graph, e in PREFETCHER.wait(product, graphs).items():
+        print('failed to load', product.name, graph, '(' + type(e).__name__ + ')')
+    return product
+
+#table rows in the order the table shows them for a sort_by, rows without a value last
+def sorted_rows(rows, sort_by):
+    if not sort_by:
+        return rows
+    col = sort_by[0]['column_id']
+    reverse = sort_by[0]['direction'] == 'desc'
+    has_value = lambda row: row.get(col) is not None and row.get(col) == row.get(col)
+    present = [row for row in rows if has_value(row)]
+    missing = [row for row in rows if not has_value(row)]
+    return sorted(present, key=lambda row: (isinstance(row[col], str), row[col]), reverse=reverse) + missing
@@ -1,6 +1,7 @@
 import pandas as pd
-from product import Product as P
-import product as p
+import catalog
+from specindex import SpecIndex
+from excelproduct import ExcelProduct
 
 '''index corresponds to graph_objects'''
 CL_INDEX = 0
@@ -12,8 +13,29 @@ IF_R_INDEX = 5
 CLvLO_INDEX = 6
 IIP3vLO_INDEX = 7
 
+#where each graph's lines are listed on the Mapping sheet: graph index -> (row, col)
+MAPPING_CELLS = {
+    CL_INDEX : (10, 0),
+    IIP3_INDEX : (10, 10),
+    LORF_ISO_INDEX : (10, 20),
+    LOIF_ISO_INDEX : (20, 0),
+    RFIF_ISO_INDEX : (20, 10),
+    IF_R_INDEX : (20, 20),
+    CLvLO_INDEX : (30, 0),
+    IIP3vLO_INDEX : (30, 10),
+}
+
+#spec ranges a search can ask for
+SEARCH_RANGES = [('rf-low', 'rf-high'), ('lo-low', 'lo-high'), ('if-low', 'if-high'), ('lodr-low', 'lodr-high')]
+
+SPECS_FILE = 'data/mixerexcels/mixerproductspecs.xlsx'
+
 def load_specs():
-    df = pd.read_excel('data/mixerexcels/mixerproductspecs.xlsx', sheet_name='Sheet1', index_col=0)
+    datasheet = catalog.load_specs('Mixer', SPECS_FILE)
+    if datasheet is not None:
+        return datasheet
+
+    df = pd.read_excel(SPECS_FILE, sheet_name='Sheet1', index_col=0)
 
     datasheet = {}
 
@@ -39,54 +61,21 @@ def load_specs():
     return datasheet
 
 # Class for Mixers
-class Mixer(P):
+class Mixer(ExcelProduct):
+    mapping_sheet = 'Mapping'
+    mapping_cells = MAPPING_CELLS
 
     def __init__(self, name):
         super().__init__(name)
 
-        self.spreadsheet = 'data/mixerexcels/' + P.products[name]['excel'] + '.xlsx'
-        P.data_sheets[self.spreadsheet] = {}
-
-    def load_graph_data(self, graph):
-        if graph in self.data: return
-        if graph == P.graph_options[CL_INDEX]:
-            self.loaddata(CL_INDEX, 10, 0)
-        elif graph == P.graph_options[IIP3_INDEX]:
-            self.loaddata(IIP3_INDEX, 10, 10)
-        elif graph == P.graph_options[LORF_ISO_INDEX]:
-            self.loaddata(LORF_ISO_INDEX, 10, 20)
-        elif graph == P.graph_options[LOIF_ISO_INDEX]:
-            self.loaddata(LOIF_ISO_INDEX, 20, 0)
-        elif graph == P.graph_options[RFIF_ISO_INDEX]:
-            self.loaddata(RFIF_ISO_INDEX, 20, 10)
-        elif graph == P.graph_options[IF_R_INDEX]:
-            self.loaddata(IF_R_INDEX, 20, 20)
-        elif graph == P.graph_options[CLvLO_INDEX]:
-            self.loaddata(CLvLO_INDEX, 30, 0)
-        elif graph == P.graph_options[IIP3vLO_INDEX]:
-            self.loaddata(IIP3vLO_INDEX, 30, 10)
-        
-    #load product data for graph
-    def loaddata(self, index, row, col):
-        if 'Mapping' in P.data_sheets[self.spreadsheet]:
-            df = P.data_sheets[self.spreadsheet]['Mapping']
-        else:
-            df = pd.read_excel(self.spreadsheet, sheet_name='Mapping', header=None, na_filter=False)
-            P.data_sheets[self.spreadsheet]['Mapping'] = df
-        
-        self.data[P.graph_options[index]] = {}
-        self.linekeys[P.graph_options[index]] = []
-
-        numlines = df.iloc[row-2,col+1]
-        for i in range(numlines):
-            label, xsheet, xaxis, xmin, xmax, ysheet, yaxis, ymin, ymax = p.get_cell_parameters(df,row+i,col)
-            if type(label) == type('string'):
-                data = p.getcelldata(index, self.spreadsheet, xsheet, xaxis, xmin, xmax, ysheet, yaxis, ymin, ymax)
-                self.data[P.graph_options[index]][label] = data
-                self.linekeys[P.graph_options[index]].append(label)
-
-    def load_class_vars():
-        P.graph_options = [
+        self.spreadsheet = 'data/mixerexcels/' + self.products[name]['excel'] + '.xlsx'
+        self.source = self.spreadsheet
+
+    #family metadata, loaded once and then only read by every session
+    @classmethod
+    def load_class_vars(cls):
+        if cls.products is not None: return
+        cls.graph_options = [
             'Conversion Loss',
             'Input IP3',
             'LO to RF Isolation',
@@ -98,50 +87,50 @@ class Mixer(P):
             'Spectrum Analyzer',
             ]
 
-        P.graph_labels = {
-            P.graph_options[CL_INDEX] : {
+        cls.graph_labels = {
+            cls.graph_options[CL_INDEX] : {
                 'xlabel' : 'RF Freq',
                 'ylabel' : 'Conv. Loss',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[IIP3_INDEX] : {
+            cls.graph_options[IIP3_INDEX] : {
                 'xlabel' : 'RF Freq',
                 'ylabel' : 'Input IP3',
                 'xunit' : '(GHz)',
                 'yunit' : '(dBm)',
             },
-            P.graph_options[IF_R_INDEX] : {
+            cls.graph_options[IF_R_INDEX] : {
                 'xlabel' : 'IF Freq',
                 'ylabel' : 'Relative IF Response',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[LORF_ISO_INDEX] : {
+            cls.graph_options[LORF_ISO_INDEX] : {
                 'xlabel' : 'LO Freq',
                 'ylabel' : 'LO-RF Isolation',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[CLvLO_INDEX] : {
+            cls.graph_options[CLvLO_INDEX] : {
                 'xlabel' : 'RF Freq',
                 'ylabel' : 'Conv. Loss',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[IIP3vLO_INDEX] : {
+            cls.graph_options[IIP3vLO_INDEX] : {
                 'xlabel' : 'RF Freq',
                 'ylabel' : 'Input IP3',
                 'xunit' : '(GHz)',
                 'yunit' : '(dBm)',
             },
-            P.graph_options[LOIF_ISO_INDEX] : {
+            cls.graph_options[LOIF_ISO_INDEX] : {
                 'xlabel' : 'LO Freq',
                 'ylabel' : 'LO-IF Isolation',
                 'xunit' : '(GHz)',
                 'yunit' : '(dB)',
             },
-            P.graph_options[RFIF_ISO_INDEX] : {
+            cls.graph_options[RFIF_ISO_INDEX] : {
                 'xlabel' : 'RF Freq',
                 'ylabel' : 'RF-IF Isolation',
                 'xunit' : '(GHz)',
@@ -149,6 +138,9 @@ class Mixer(P):
             },   
         }  
 
-        P.products = load_specs()
+        products = load_specs()
+        cls.spec_index = SpecIndex(products, SEARCH_RANGES)
+        # set last, the family is loaded once products is set
+        cls.products = products
 
 
@@ -8,22 +8,73 @@ https://scikit-rf.readthedocs.io/en/latest/tutorials/Introduction.html
 https://scikit-rf.readthedocs.io/en/latest/_modules/skrf/io/touchstone.html
 
 
+Derived metrics (directivity, balances, ...) are declared per family as
+functions of the product over its s-parameters, with the ports named by
+one-letter aliases: p.s_db('xy') is the s-parameter from port y to port x in
+dB, p.s_angle('xy') its angle in degrees. They are computed over all the
+frequency points at once.
+
 Passives: Couplers, Power Dividers
 '''
 
 import skrf as rf
 from product import Product
+from cache import nbytes
 
 class Passive(Product):
+    #metric -> function of the product computing it from the s-parameters, set by subclasses
+    metrics = {}
+    #port alias -> attribute holding the port number, set by subclasses
+    port_aliases = {}
+
     def __init__(self, name, producttype):
         Product.__init__(self, name)
 
         self.filepath = 'data/' + producttype + '-files/' + self.products[name]['file']
-        self.touchstone = rf.Touchstone(self.filepath)
-        self.touchstone_data = self.touchstone.get_sparameter_data('db')
+        self.source = self.filepath
+        # only the header is read here, the data is parsed when a graph needs it
+        self.touchstone = rf.Touchstone(self.filepath, lazy=True)
+        self._frequency = None
+        #metric -> values, computed once per product
+        self.metric_values = {}
+
+    #s-parameter from port j to port i in dB, only this column is converted, on first use
+    def sparam_db(self, i, j):
+        return self.touchstone.sparam('S' + i + j, 'db')[0]
+
+    #angle (degrees) of the s-parameter from port j to port i
+    def sparam_angle(self, i, j):
+        return self.touchstone.sparam('S' + i + j, 'db')[1]
+
+    #s-parameter in dB between the ports of two aliases, 'xy' is from port y to port x
+    def s_db(self, aliases):
+        return self.sparam_db(*self.ports(aliases))
+
+    #angle (degrees) of the s-parameter between the ports of two aliases
+    def s_angle(self, aliases):
+        return self.sparam_angle(*self.ports(aliases))
+
+    #port numbers of two port aliases
+    def ports(self, aliases):
+        return tuple(getattr(self, self.port_aliases[alias]) for alias in aliases)
+
+    #values of a derived metric at every frequency point
+    def metric(self, name):
+        values = self.metric_values.get(name)
+        if values is None:
+            values = self.metrics[name](self)
+            self.metric_values[name] = values
+        return values
+
+    #graph data plus the parsed touchstone values
+    def nbytes(self):
+        return Product.nbytes(self) + self.touchstone.nbytes() + nbytes(self.metric_values)
 
+    #frequency axis in GHz, one array shared by every curve of the file
     def get_frequency_data(self):
-        return list(map(lambda x : (x / pow(10,9)), self.touchstone_data['frequency']))
+        if self._frequency is None:
+            self._frequency = self.touchstone.get_frequency() / pow(10,9)
+        return self._frequency
 
 class WrongPassiveException(Exception):
     pass
\ No newline at end of file
@@ -0,0 +1,80 @@
+'''
+Serialization of the curve and table values sent to the browser.
+
+Values are rounded to PLOT_DIGITS significant digits, the precision of the
+measurements, so their JSON text stays short. Where the plotly.js served by
+Dash decodes typed arrays (plotly.js 2.28 and later, served only by the Dash
+releases that serve the plotly.js of the installed plotly package, those with
+Dash._setup_plotlyjs), the x and y arrays of a trace are sent as
+{'dtype', 'bdata'} objects holding the base64 of the raw values, float32
+unless more than 7 digits are asked for. Older versions get rounded lists.
+
+    PRODUCTSEARCH_PLOT_DIGITS    significant digits kept (default 7)
+    PRODUCTSEARCH_TYPED_ARRAYS   auto (default), on or off
+'''
+
+import os
+import base64
+from numbers import Real, Integral
+import numpy
+import dash
+
+PLOT_DIGITS = int(os.environ.get('PRODUCTSEARCH_PLOT_DIGITS', 7))
+TYPED_ARRAYS = os.environ.get('PRODUCTSEARCH_TYPED_ARRAYS', 'auto')
+
+#float32 keeps a bit over 7 significant digits
+TYPED_DTYPE = 'f4' if PLOT_DIGITS <= 7 else 'f8'
+
+#(major, minor) of a version string
+def version(text):
+    return tuple(int(part) for part in text.split('.')[:2])
+
+#True if the plotly.js of the app decodes base64 typed arrays
+def typed_arrays_supported():
+    if TYPED_ARRAYS in ('on', 'off'):
+        return TYPED_ARRAYS == 'on'
+    # Dash 1 and the first Dash 2 releases serve the plotly.js bundled with dash-core-components,
+    # too old for them whatever plotly package is installed
+    if not hasattr(dash.Dash, '_setup_plotlyjs'):
+        return False
+    try:
+        from plotly.offline import get_plotlyjs_version
+        return version(get_plotlyjs_version()) >= (2, 28)
+    except (ImportError, ValueError):
+        return False
+
+TYPED = typed_arrays_supported()
+
+#values rounded to digits significant digits, NaN and infinities are kept
+def round_significant(values, digits=PLOT_DIGITS):
+    values = numpy.asarray(values, dtype=numpy.float64)
+    rounded = values.copy()
+    finite = numpy.isfinite(values) & (values != 0)
+    if not finite.any():
+        return rounded
+    v = values[finite]
+    exponents = digits - 1 - numpy.floor(numpy.log10(numpy.abs(v)))
+    # powers of ten are exact only from 1 up, divide by them instead of multiplying by 10**-n
+    scales = 10.0 ** numpy.abs(exponents)
+    rounded[finite] = numpy.where(exponents >= 0, numpy.round(v * scales) / scales, numpy.round(v / scales) * scales)
+    return rounded
+
+#x or y values of a trace: a typed array if plotly.js decodes them, else a rounded list
+def encode_array(values):
+    if TYPED:
+        data = round_significant(values).astype(TYPED_DTYPE)
+        return {'dtype' : TYPED_DTYPE, 'bdata' : base64.b64encode(data.tobytes()).decode('ascii')}
+    return round_significant(values).tolist()
+
+#float cells of table rows rounded to PLOT_DIGITS significant digits
+def round_rows(rows):
+    if not rows:
+        return rows
+    rounded = []
+    for row in rows:
+        row = dict(row)
+        for key, value in row.items():
+            if isinstance(value, Real) and not isinstance(value, Integral):
+                row[key] = float(round_significant(value))
+        rounded.append(row)
+    return rounded
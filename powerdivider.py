@@ -1,7 +1,13 @@
+import os
+import bisect
+import numpy
 from numpy import DataSource
 import pandas as pd
 from passive import Passive, WrongPassiveException
 from product import Product as P
+import catalog
+from specindex import SpecIndex
+from curve import Curve
 
 '''index corresponds to graph_objects'''
 RL = 'Return Loss'
@@ -10,8 +16,21 @@ ISO = 'Isolation'
 AMP_B = 'Amplitude Balance'
 PH_B = 'Phase Balance'
 
+#unwrap the phase balance before dropping its outliers, so the 360 degree jumps are
+#removed instead of the points after them (rebuild the catalog after changing it)
+UNWRAP_PHASE = os.environ.get('PRODUCTSEARCH_UNWRAP_PHASE', '') not in ('', '0')
+
+#spec ranges a search can ask for
+SEARCH_RANGES = [('freq-low', 'freq-high')]
+
+SPECS_FILE = 'data/powdiv-files/powdivproductspecs.xlsx'
+
 def load_specs():
-    df = pd.read_excel('data/powdiv-files/powdivproductspecs.xlsx', sheet_name='Sheet1', index_col=0)
+    datasheet = catalog.load_specs('PowerDivider', SPECS_FILE)
+    if datasheet is not None:
+        return datasheet
+
+    df = pd.read_excel(SPECS_FILE, sheet_name='Sheet1', index_col=0)
 
     datasheet = {}
 
@@ -28,6 +47,11 @@ def load_specs():
     return datasheet
 
 class PowerDivider(Passive):
+    port_aliases = {'c' : 'commonport', '1' : 'outport1', '2' : 'outport2'}
+    metrics = {
+        AMP_B : lambda p: p.s_db('c1') - p.s_db('c2'),
+        PH_B : lambda p: p.s_angle('c2') - p.s_angle('c1'),
+    }
 
     def __init__(self, name):
         Passive.__init__(self, name, 'powdiv')
@@ -75,10 +99,13 @@ class PowerDivider(Passive):
         elif graph == PH_B:
             self.get_phasebal_data()
             
-    def load_class_vars():
-        P.graph_options = [RL, IL, ISO, AMP_B, PH_B]
+    #family metadata, loaded once and then only read by every session
+    @classmethod
+    def load_class_vars(cls):
+        if cls.products is not None: return
+        cls.graph_options = [RL, IL, ISO, AMP_B, PH_B]
 
-        P.graph_labels = {
+        cls.graph_labels = {
             RL : {
                 'xlabel' : 'Frequency',
                 'ylabel' : 'Return Loss',
@@ -111,17 +138,17 @@ class PowerDivider(Passive):
             },
         }  
 
-        P.products = load_specs()
+        products = load_specs()
+        cls.spec_index = SpecIndex(products, SEARCH_RANGES)
+        # set last, the family is loaded once products is set
+        cls.products = products
 
     def get_returnloss_data(self):
         data = dict()
         xdata = self.get_frequency_data()
-        data['Common'] = {'xdata' : xdata,
-                        'ydata' : self.touchstone_data['S' + self.commonport + self.commonport + 'DB']}
-        data['Out 1'] = {'xdata' : xdata,
-                        'ydata' : self.touchstone_data['S' + self.outport1 + self.outport1 + 'DB']}
-        data['Out 2'] = {'xdata' : xdata,
-                        'ydata' : self.touchstone_data['S' + self.outport2 + self.outport2 + 'DB']}
+        data['Common'] = Curve(xdata, self.sparam_db(self.commonport, self.commonport))
+        data['Out 1'] = Curve(xdata, self.sparam_db(self.outport1, self.outport1))
+        data['Out 2'] = Curve(xdata, self.sparam_db(self.outport2, self.outport2))
        
         self.data[RL] = data 
         self.linekeys[RL] = ['Common', 'Out 1', 'Out 2']
@@ -129,16 +156,14 @@ class PowerDivider(Passive):
     def get_insertionloss_data(self):
         data = dict()
         frequencydata = self.get_frequency_data()
-        out1 = self.touchstone_data['S' + self.commonport + self.outport1 + 'DB']
-        out2 = self.touchstone_data['S' + self.commonport + self.outport2 + 'DB']
+        out1 = self.sparam_db(self.commonport, self.outport1)
+        out2 = self.sparam_db(self.commonport, self.outport2)
 
         xdata1, ydata1 = self.handle_outliers(frequencydata, out1)
         xdata2, ydata2 = self.handle_outliers(frequencydata, out2)
 
-        data['Out 1'] = {'xdata' : xdata1,
-                        'ydata' : ydata1}
-        data['Out 2'] = {'xdata' : xdata2,
-                        'ydata' : ydata2}
+        data['Out 1'] = Curve(xdata1, ydata1)
+        data['Out 2'] = Curve(xdata2, ydata2)
         
         self.data[IL] = data
         self.linekeys[IL] = ['Out 1', 'Out 2']
@@ -146,77 +171,66 @@ class PowerDivider(Passive):
     def get_isolation_data(self):
         data = dict()
         xdata = self.get_frequency_data()
-        data[ISO] = {'xdata' : xdata, 
-                    'ydata' : self.touchstone_data['S' + self.outport1 + self.outport2 + 'DB']}
+        data[ISO] = Curve(xdata, self.sparam_db(self.outport1, self.outport2))
         self.data[ISO] = data
         self.linekeys[ISO] = [ISO]
 
     def get_amplitudebal_data(self):
-        out1 = self.touchstone_data['S' + self.commonport + self.outport1 + 'DB']
-        out2 = self.touchstone_data['S' + self.commonport + self.outport2 + 'DB']
-        zipped = zip(out2, out1)
-        ampbal = []
-
-        for one,two in zipped:
-            ampbal.append(two-one)
-
-        xdata, ydata = self.handle_outliers(self.get_frequency_data(), ampbal)
+        xdata, ydata = self.handle_outliers(self.get_frequency_data(), self.metric(AMP_B))
 
         data = dict()
-        data[AMP_B] = {'xdata' : xdata,
-                        'ydata' : ydata}
+        data[AMP_B] = Curve(xdata, ydata)
         self.data[AMP_B] = data
         self.linekeys[AMP_B] = [AMP_B]
 
     def get_phasebal_data(self):
         if self.name[0:3] == 'PBR':
             data = dict()
-            data[PH_B] = {'xdata' : [],
-                            'ydata' : []}
+            data[PH_B] = Curve([], [])
             self.data[PH_B] = data
             self.linekeys[PH_B] = [PH_B]
             return
 
-        out1 = self.touchstone_data['S' + self.commonport + self.outport1 + 'A']
-        out2 = self.touchstone_data['S' + self.commonport + self.outport2 + 'A']        
-        zipped = zip(out1, out2)
-        phasebal = []
-
-        for one,two in zipped:
-            phasebal.append(two - one)
-
-        xdata, ydata = self.handle_outliers(self.get_frequency_data(), phasebal)
+        xdata, ydata = self.handle_outliers(self.get_frequency_data(), self.metric(PH_B), UNWRAP_PHASE)
 
         data = dict()
-        data[PH_B] = {'xdata' : xdata,
-                        'ydata' : ydata}
+        data[PH_B] = Curve(xdata, ydata)
         self.data[PH_B] = data
         self.linekeys[PH_B] = [PH_B]
 
-    def handle_outliers(self, xdata, ydata):
-        xreturn = []
-        yreturn = []
-
-        prev, prev_diff = None, None
-
-        for i in range(len(xdata)):
-            yval = ydata[i]
-            xval = xdata[i]
-
-            if prev == None:
-                prev = yval
-                prev_diff = None
-                yreturn.append(yval)
-                xreturn.append(xval)
-            elif prev_diff == None:
-                prev_diff = yval - prev
-                prev = yval
-                yreturn.append(yval)
-                xreturn.append(xval)
-            elif abs(prev_diff - (yval - prev)) < 1:
-                prev_diff = yval - prev
-                prev = yval
-                yreturn.append(yval)
-                xreturn.append(xval)
-
-        return xreturn, yreturn
+    #drop the points whose step from the last kept point differs by 1 or more
+    #from the step between the two points kept before it
+    def handle_outliers(self, xdata, ydata, unwrap=False):
+        xdata = numpy.asarray(xdata)
+        ydata = numpy.asarray(ydata, dtype=numpy.float64)
+        if unwrap:
+            ydata = numpy.degrees(numpy.unwrap(numpy.radians(ydata)))
+
+        steps = numpy.diff(ydata)
+        # points dropped when the two points before them are kept, point k + 2 for second difference k
+        jumps = numpy.flatnonzero(~(numpy.abs(steps[:-1] - steps[1:]) < 1)) + 2
+
+        if len(jumps) == 0:
+            # nothing dropped, keep sharing the frequency array
+            return xdata, ydata
+        kept = numpy.ones(len(ydata), dtype=bool)
+        jumps = jumps.tolist()
+        y = ydata.tolist()
+        a, b, i = 0, 1, 2
+        while i < len(y):
+            if a == i - 2 and b == i - 1:
+                # every point is kept up to the next jump
+                k = bisect.bisect_left(jumps, i)
+                if k == len(jumps):
+                    break
+                i = jumps[k]
+                a, b = i - 2, i - 1
+                kept[i] = False
+            # after a dropped point, check against the last two kept ones until they are adjacent again
+            elif abs((y[b] - y[a]) - (y[i] - y[b])) < 1:
+                a, b = b, i
+            else:
+                kept[i] = False
+            i += 1
+
+        return xdata[kept], ydata[kept]
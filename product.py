@@ -1,4 +1,15 @@
+import os
+import threading
+import numpy
 import pandas as pd
+import openpyxl
+import catalog
+import sharedstore
+from cache import LRUCache, SingleFlight, budget_from_env, nbytes
+from loading import LOAD_TIMEOUT
+from curveindex import CurveIndex
+from curve import to_float_array
+from curvecache import file_stamp
 
 '''Marki colors for line plot colors'''
 LINE_COLORS = [
@@ -8,40 +19,139 @@ LINE_COLORS = [
     '#EBEB7C',  #yellow-green
     '#00A6A6',  #teal
 ]
+LINE_COLORS_LOCK = threading.Lock()
 
 DEBUG = False
 
+#how measurement sheets are read, 'stream' or 'pandas' (see ExcelReader)
+EXCEL_READER = os.environ.get('PRODUCTSEARCH_EXCEL_READER', 'stream')
+
+#memory budget of the excel sheets kept in Product.data_sheets
+SHEET_CACHE_BYTES = budget_from_env('PRODUCTSEARCH_SHEET_CACHE_MB', 256)
+
+#loads in flight: (family, product, graph) and (excel, sheet), waited for at most LOAD_TIMEOUT seconds
+#(the graphs a request needs from a product are read together, see fetch_graphs)
+GRAPH_LOADS = SingleFlight(LOAD_TIMEOUT)
+SHEET_READS = SingleFlight(LOAD_TIMEOUT)
+
 class Product:
     graph_options = None
     graph_labels = None
     products = None
-    data_sheets = {}
+    spec_index = None
+    #(excel, sheet) -> DataFrame, shared by every product
+    data_sheets = LRUCache(SHEET_CACHE_BYTES)
 
     def __init__(self, name):
         self.name = name
         self.datasheet = 'https://www.markimicrowave.com/Assets/DataSheets/' + name + '.pdf'
 
         self.color = None
+
+        #file the product's data is read from (set by subclasses)
+        self.source = None
     
         self.data = {}
         self.linekeys = {}
+        self.indexes = {}
+        #graph -> mtime/size of the source file its data was read from
+        self.stamps = {}
 
-    # get object's column info
+    # get a copy of object's column info (the spec sheet is shared)
     def get_col_data(self):
-        return Product.products[self.name]
+        return dict(self.products[self.name])
+
+    #Load graph data from the catalog or the shared store if it is there,
+    #else from the product's files (and publish it to the shared store)
+    #a graph is loaded once its line keys are set, they are always set after its data
+    #concurrent loads of a product's graph, by any object of the product, run once
+    def fetch_graph_data(self, graph):
+        errors = self.fetch_graphs([graph])
+        if graph in errors:
+            raise errors[graph]
+
+    #fetch_graph_data of several graphs, the ones read from the product's files are read together (see load_graphs)
+    #returns graph -> error for the graphs that failed
+    def fetch_graphs(self, graphs):
+        prefix = (type(self).__name__, self.name)
+        keys = [prefix + (graph,) for graph in graphs if graph not in self.linekeys]
+        if not keys: return {}
+
+        def read(leading):
+            loaded, errors = self.read_graphs([key[2] for key in leading])
+            return ({prefix + (graph,) : value for graph, value in loaded.items()},
+                    {prefix + (graph,) : e for graph, e in errors.items()})
+
+        loaded, errors = GRAPH_LOADS.do_many(keys, read)
+        for key, value in loaded.items():
+            graph = key[2]
+            if value is not None and graph not in self.linekeys:
+                data, linekeys, indexes, stamp = value
+                self.data[graph] = data
+                self.indexes.update(indexes)
+                self.stamps[graph] = stamp
+                self.linekeys[graph] = linekeys
+        return {key[2] : e for key, e in errors.items()}
+
+    #load graphs into this object, returns (graph -> (data, linekeys, indexes, stamp) or None if it has no
+    #such graph, graph -> error for the graphs that failed)
+    def read_graphs(self, graphs):
+        # taken before the read: data of a file changed while it is read is keyed as the older version
+        stamp = source_stamp(self.source)
+        unread = []
+        for graph in graphs:
+            if graph in self.linekeys:
+                continue
+            self.stamps[graph] = stamp
+            cached = catalog.load_graph(self, graph)
+            if cached is None:
+                cached = sharedstore.load_graph(self, graph)
+            if cached is not None:
+                self.data[graph], self.linekeys[graph] = cached
+            else:
+                unread.append(graph)
+        errors = self.load_graphs(unread) if unread else {}
+        for graph in unread:
+            if graph not in errors:
+                sharedstore.publish(self, graph)
+
+        loaded = {}
+        for graph in graphs:
+            if graph in errors:
+                continue
+            # windowed statistics indexes are built by getindex, when a search first needs them
+            for label in self.data.get(graph, {}):
+                self.data[graph][label].build_pyramid()
+            if graph not in self.linekeys:
+                loaded[graph] = None
+                continue
+            indexes = {(graph, label) : self.indexes[(graph, label)] for label in self.data[graph] if (graph, label) in self.indexes}
+            loaded[graph] = (self.data[graph], self.linekeys[graph], indexes, self.stamps.get(graph))
+        return loaded, errors
+
+    #load several graphs from the product's files, returns graph -> error for the graphs that failed
+    #(ExcelProduct reads all of them with one pass over each sheet)
+    def load_graphs(self, graphs):
+        errors = {}
+        for graph in graphs:
+            try:
+                self.load_graph_data(graph)
+            except Exception as e:
+                errors[graph] = e
+        return errors
 
     #Get data to plot graph
     def getdata(self, graph, d=None):
-        if graph not in self.data:
-            self.load_graph_data(graph)
+        if graph not in self.linekeys:
+            self.fetch_graph_data(graph)
         if d == None:
             return self.data[graph]
         return self.data[graph][d]
 
     #Get lables for ploted lines
     def getlinekeys(self, graph):
-        if graph not in self.data:
-            self.load_graph_data(graph)
+        if graph not in self.linekeys:
+            self.fetch_graph_data(graph)
         return self.linekeys[graph]
 
     #sets color of product's graph plots
@@ -50,80 +160,62 @@ class Product:
 
     # get min/max/med of a graph
     def getystats(self, xlow, xhigh, graph):
-        if graph not in self.data:
-            self.load_graph_data(graph)
-        min, max, med = None, None, None
-        graph_data = self.data[graph]
-        if len(graph_data) == 0: return None, None, None, None, None, None
-        dict = graph_data[list(graph_data.keys())[0]]
-        x = dict['xdata']
-        y = dict['ydata']
-        data_list = []
-        for i in range(len(x)):
-            if xlow <= x[i] <= xhigh:
-                data_list.append(y[i])
-            elif x[i] > xhigh:
-                break
-        if len(data_list) == 0: return None, None, None, None, None, None
-        sorted_list = sort_list(data_list)
-        min = sorted_list[0]
-        max = sorted_list[-1]
-        med = get_median(sorted_list)
-        
-        if len(graph_data) == 2:
-            bmin, bmax, bmed = None, None, None
-            dict = graph_data[list(graph_data.keys())[1]]
-            x = dict['xdata']
-            y = dict['ydata']
-            data_list = []
-            for i in range(len(x)):
-                if xlow <= x[i] <= xhigh:
-                    data_list.append(y[i])
-                elif x[i] > xhigh:
-                    break
-            sorted_list = sort_list(data_list)
-            bmin = sorted_list[0]
-            bmax = sorted_list[-1]
-            bmed = get_median(sorted_list)
+        if graph not in self.linekeys:
+            self.fetch_graph_data(graph)
+        labels = list(self.data[graph])
+        if len(labels) == 0: return None, None, None, None, None, None
+
+        stats = self.getindex(graph, labels[0]).stats(xlow, xhigh)
+        if stats == None: return None, None, None, None, None, None
+        min, max, med = stats
+
+        if len(labels) == 2:
+            bstats = self.getindex(graph, labels[1]).stats(xlow, xhigh)
+            if bstats == None: return min, max, med, None, None, None
+            bmin, bmax, bmed = bstats
             return min,max,med,bmin,bmax,bmed
         else:
             return min,max,med,None,None,None
 
+    #getystats of a graph for every product of a table, each line answered by its windowed index
+    @staticmethod
+    def batch_ystats(products, graph, xlow, xhigh):
+        return [p.getystats(xlow, xhigh, graph) for p in products]
+
+    #Get the windowed statistics index of a plotted line
+    def getindex(self, graph, label):
+        if graph not in self.linekeys:
+            self.fetch_graph_data(graph)
+        if (graph, label) not in self.indexes:
+            self.build_index(graph, label)
+        return self.indexes[(graph, label)]
+
+    def build_index(self, graph, label):
+        line = self.data[graph][label]
+        self.indexes[(graph, label)] = CurveIndex(line.x, line.y)
+
+    #approximate memory held by the object's graph data and indexes
+    def nbytes(self):
+        return nbytes(self.data) + sum(index.nbytes() for index in self.indexes.values())
+
 
 '''helper functions'''
 
-#uses merge sort (recursive)
-def sort_list(list):
-    if len(list) == 0 or len(list) == 1:
-        return list
-    L1 = sort_list(list[:int(len(list)/2)])
-    L2 = sort_list(list[int(len(list)/2):])
-    sorted = []
-    while (len(L1) > 0):
-        if len(L2) == 0:
-            for i in range(len(L1)):
-                sorted.append(L1.pop(0))
-        elif L1[0] < L2[0]:
-            sorted.append(L1.pop(0))
-        else:
-            sorted.append(L2.pop(0))
-    if len(L2) > 0:
-        for i in range(len(L2)):
-            sorted.append(L2.pop(0))
-    return sorted
-
-def get_median(list):
-    if len(list) % 2 == 0:
-        med = ( list[int(len(list) / 2)] + list[int(len(list) / 2) - 1] ) / 2
-    else:
-        med = list[int(len(list) / 2)]
-    return med     
+#mtime/size of a product's source file, None if it has none or it can't be read
+def source_stamp(source):
+    if source is None:
+        return None
+    try:
+        return file_stamp(source)
+    except OSError:
+        return None
 
 # cycles through colors used for plot lines
 def line_color():
     global LINE_COLORS
-    color = LINE_COLORS.pop(0)
-    LINE_COLORS.append(color)
+    with LINE_COLORS_LOCK:
+        color = LINE_COLORS.pop(0)
+        LINE_COLORS.append(color)
     return color
 
 #translate a set of letter(s) into an excel's column number
@@ -153,29 +245,86 @@ def get_cell_parameters(df,row,col):
     ymax = df.iloc[row,col+8]
     return label, xsheet, xaxis, xmin, xmax, ysheet, yaxis, ymin, ymax
 
-#Get cells from excel sheet
-def getcelldata(i_graph, excel, xsheet, xaxis, xmin, xmax, ysheet, yaxis, ymin, ymax):
-    if DEBUG: print(excel, xsheet, xaxis, xmin, xmax, ysheet, yaxis, ymin, ymax)
-    if xsheet in Product.data_sheets[excel]:
-        df = Product.data_sheets[excel][xsheet]
-        if DEBUG: print('sheet1 retrieved')
-    else:
-        df = pd.read_excel(excel, sheet_name=xsheet, header=None, na_filter=False)
-        Product.data_sheets[excel][xsheet] = df
-        if DEBUG: print('sheet1 read')
-    if ysheet in Product.data_sheets[excel]:
-        df2 = Product.data_sheets[excel][ysheet]
-        if DEBUG: print('sheet2 retrieved')
-    else: 
-        df2 = pd.read_excel(excel, sheet_name=ysheet, header=None, na_filter=False)
-        Product.data_sheets[excel][ysheet] = df2
-        if DEBUG: print('sheet2 read')
-
-    data = {'xdata' 
-                : list(df.iloc[xmin-1:xmax,column_index(xaxis)]), 
-            'ydata'
-                : list(df2.iloc[ymin-1:ymax,column_index(yaxis)]), }
-    
-    return data
+#Get a sheet of an excel file, read once and kept in Product.data_sheets
+def read_sheet(excel, sheet):
+    df = Product.data_sheets.get((excel, sheet))
+    if df is None:
+        df = SHEET_READS.do((excel, sheet), lambda: read_new_sheet(excel, sheet))
+    elif DEBUG: print(sheet, 'retrieved')
+    return df
+
+def read_new_sheet(excel, sheet):
+    df = pd.read_excel(excel, sheet_name=sheet, header=None, na_filter=False)
+    Product.data_sheets[(excel, sheet)] = df
+    if DEBUG: print(sheet, 'read')
+    return df
+
+#Reads cell ranges of a workbook as float64 arrays (blank and text cells are NaN)
+#'stream' mode only reads the rows and columns around the ranges with openpyxl,
+#'pandas' mode reads whole sheets with pandas and keeps them in Product.data_sheets
+class ExcelReader:
+
+    def __init__(self, excel, mode=None):
+        self.excel = excel
+        self.mode = mode or EXCEL_READER
+        self.workbook = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.close()
+            self.workbook = None
+
+    #ranges: [(col, start row, stop row)] with 0 based, end exclusive rows
+    def read_ranges(self, sheet, ranges):
+        if DEBUG: print(self.excel, sheet, ranges)
+        if self.mode == 'pandas':
+            df = read_sheet(self.excel, sheet)
+            return [to_float_array(df.iloc[start:stop, col]) for col, start, stop in ranges]
+        # the same ranges asked for concurrently are streamed once
+        key = (self.excel, sheet, tuple(ranges))
+        return SHEET_READS.do(key, lambda: self.stream_ranges(sheet, ranges))
+
+    #read the bounding box of the ranges in one pass over the sheet
+    def stream_ranges(self, sheet, ranges):
+        if self.workbook is None:
+            self.workbook = openpyxl.load_workbook(self.excel, read_only=True, data_only=True)
+        if sheet not in self.workbook.sheetnames:
+            raise ValueError('Worksheet named \'%s\' not found' % sheet)
+        min_col = min(col for col, start, stop in ranges)
+        max_col = max(col for col, start, stop in ranges)
+        min_row = min(start for col, start, stop in ranges)
+        max_row = max(stop for col, start, stop in ranges)
+        if max_row <= min_row:
+            return [numpy.zeros(0) for r in ranges]
 
+        worksheet = self.workbook[sheet]
+        if worksheet.max_column is not None and max_col >= worksheet.max_column:
+            raise IndexError('column %i is out of the sheet' % max_col)
+        rows = list(worksheet.iter_rows(min_row=min_row + 1, max_row=max_row,
+                                                   min_col=min_col + 1, max_col=max_col + 1,
+                                                   values_only=True))
+        # rows past the end of the sheet's data are dropped, as pandas does
+        last = len(rows)
+        while last and all(v is None for v in rows[last - 1]):
+            last -= 1
+        if last < len(rows):
+            # the data of columns outside the ranges can run further, pandas keeps those rows (as NaN)
+            tail = worksheet.iter_rows(min_row=min_row + last + 1, max_row=max_row, values_only=True)
+            end = last
+            for i, row in enumerate(tail):
+                if any(v is not None for v in row):
+                    end = last + i + 1
+            rows = rows[:end]
+        return [to_float_array([row[col - min_col] for row in rows[start - min_row:stop - min_row]])
+                for col, start, stop in ranges]
 
+#Get the values of several cell ranges of an excel sheet, see ExcelReader
+def read_ranges(excel, sheet, ranges):
+    with ExcelReader(excel) as reader:
+        return reader.read_ranges(sheet, ranges)
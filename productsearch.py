@@ -3,10 +3,19 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_table as dt
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, ALL
 from dash_table.Format import Format, Scheme
+import os
+import sys
+import json
+import uuid
 import numpy
+import flask
+from flask_compress import Compress
 
+from cache import LRUCache, budget_from_env, nbytes
+from product import Product
+from excelproduct import ExcelProduct
 from mixer import Mixer as M
 import mixer as m
 from amplifier import Amplifier as A
@@ -15,13 +24,46 @@ import powerdivider as powdiv
 from coupler import Coupler as CO
 from balun import Balun as B
 import balun
-
-ACTIVE_GRAPHS = []
-
-LOADED_PRODUCT_OBJECTS = {}
-
-SEARCHED_PRODUCT_OBJECTS = {}
-LOW_FREQ, HIGH_FREQ = None, None
+import warmup
+import plotdata
+from loading import PREFETCHER, PREFETCH_ROWS, sorted_rows, load_all, load_graphs
+
+#family registries are shared (read only) by every session, load them before serving
+for family in (M, A, PD, CO, B):
+    family.load_class_vars()
+
+#memory budget of the product objects (and their graph data) kept between requests
+OBJECT_CACHE_BYTES = budget_from_env('PRODUCTSEARCH_OBJECT_CACHE_MB', 256)
+LOADED_PRODUCT_OBJECTS = LRUCache(OBJECT_CACHE_BYTES)
+
+#width in pixels of a graph, a curve is sent with about two points (min and max) per pixel
+#of its visible part, picked again when the graph is zoomed (see Curve.decimated)
+PLOT_WIDTH = int(os.environ.get('PRODUCTSEARCH_PLOT_WIDTH', 900))
+
+#figure fragments, built once and shared by every request that shows them:
+#trace dicts by (family, product, source stamp, graph, line, pyramid level, color, dash, trace type) and
+#layout dicts by (family, products and their source stamps, graph, x range); the stamps are those of
+#the files the products' graph data was read from, data read again from a changed file gets new entries
+TRACE_CACHE = LRUCache(budget_from_env('PRODUCTSEARCH_TRACE_CACHE_MB', 64))
+LAYOUT_CACHE = LRUCache(budget_from_env('PRODUCTSEARCH_LAYOUT_CACHE_MB', 8),
+                        sizeof=lambda layout: nbytes({k : v for k, v in layout.items() if k != 'template'}))
+
+#plotly's default template, sent with every figure as go.Figure does
+TEMPLATE = go.Figure().to_plotly_json()['layout'].get('template')
+
+LINE_TYPES = [None, 'dash', 'dashdot', 'dot']
+
+#graphs sending more points than WEBGL_POINTS in all are drawn with WebGL (scattergl) traces,
+#PRODUCTSEARCH_RENDER_MODE=svg or webgl forces one kind for every graph
+RENDER_MODE = os.environ.get('PRODUCTSEARCH_RENDER_MODE', 'auto')
+WEBGL_POINTS = int(os.environ.get('PRODUCTSEARCH_WEBGL_POINTS', 20000))
+#traces with more points than this use plotly's default hover label instead of the hovertemplate
+HOVER_TEMPLATE_POINTS = int(os.environ.get('PRODUCTSEARCH_HOVER_TEMPLATE_POINTS', 2000))
+
+#opt-in: load every product before serving, see warmup.py
+if warmup.requested(sys.argv):
+    for p in warmup.warm(OBJECT_CACHE_BYTES):
+        LOADED_PRODUCT_OBJECTS[p.name] = p
 
 COLOR = {
     'yellow-green': '#EBEB7C',
@@ -36,10 +78,28 @@ COLOR = {
 
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+app = dash.Dash(__name__, external_stylesheets=external_stylesheets, compress=False)
 
 server = app.server
 
+#compress responses (callback outputs, layout and assets) with the first of these the browser accepts,
+#PRODUCTSEARCH_COMPRESS=off disables it
+COMPRESS = os.environ.get('PRODUCTSEARCH_COMPRESS', 'br,gzip')
+if COMPRESS != 'off':
+    server.config['COMPRESS_ALGORITHM'] = COMPRESS.split(',')
+    Compress(server)
+
+#hit/miss/eviction counters of the sheet and object caches
+@server.route('/cache-stats')
+def cache_stats():
+    return flask.jsonify({
+        'sheets' : Product.data_sheets.stats(),
+        'mappings' : ExcelProduct.mapping_indexes.stats(),
+        'objects' : LOADED_PRODUCT_OBJECTS.stats(),
+        'traces' : TRACE_CACHE.stats(),
+        'layouts' : LAYOUT_CACHE.stats(),
+    })
+
 '''
 Display component layouts
 '''
@@ -300,6 +360,14 @@ def search_container(product):
 
     container_children.append(add_error())
 
+    # the session's last search: {'products' : ids, 'low' : low freq, 'high' : high freq,
+    # 'session' : id of the session, set by its first search}
+    container_children.append(dcc.Store(id='search-state'))
+
+    # what the graphs show (see graph_view) and the changes sent to them instead of new graphs
+    container_children.append(dcc.Store(id='graph-view'))
+    container_children.append(dcc.Store(id='graph-delta'))
+
     if product == 'm': 
         M.load_class_vars()
         title = ['Mixer Search']
@@ -586,14 +654,16 @@ def minmaxx(products, graph):
     xlow, xhigh = None, None
     for p in products:
         try:
-            a = p.getdata(graph, list(p.getdata(graph).keys())[0])
+            x = p.getdata(graph, p.getlinekeys(graph)[0]).x
         except:
             break
-        for v in a[list(a)[0]]:
-            if xlow == None or v <= xlow:
-                xlow = v
-            if xhigh == None or v >= xhigh:
-                xhigh = v
+        x = x[~numpy.isnan(x)]
+        if len(x) == 0:
+            continue
+        if xlow == None or x.min() <= xlow:
+            xlow = float(x.min())
+        if xhigh == None or x.max() >= xhigh:
+            xhigh = float(x.max())
 
     return (xlow, xhigh)
 
@@ -603,17 +673,18 @@ def minmaxy(products, xmin, xmax, graph_type):
     for p in products:
 
         for key in p.getlinekeys(graph_type):
-            a = p.getdata(graph_type, key)
-
-
-            for i in range(len(a[list(a)[1]])):
-                k = a[list(a)[0]][i]
-                v = a[list(a)[1]][i]
-                if xmin < k < xmax:
-                    if ylow == None or v < ylow:
-                        ylow = v
-                    if yhigh == None or v > yhigh:
-                        yhigh = v
+            line = p.getdata(graph_type, key)
+            # a few sheets have one x or y value more than the other, the extra one is not plotted
+            n = min(len(line.x), len(line.y))
+            x, y = line.x[:n], line.y[:n]
+            y = y[(xmin < x) & (x < xmax)]
+            y = y[~numpy.isnan(y)]
+            if len(y) == 0:
+                continue
+            if ylow == None or y.min() < ylow:
+                ylow = float(y.min())
+            if yhigh == None or y.max() > yhigh:
+                yhigh = float(y.max())
 
     if ylow != None and yhigh != None:
         ydiff = yhigh - ylow
@@ -658,55 +729,78 @@ def create_object(class_name, name):
     LOADED_PRODUCT_OBJECTS[name] = p
     return p
 
-#Create needed objects and remove uneeded ones
+#Create needed objects (concurrently), in the given order without the ones that failed
 def manage_load(selected_products_set, class_name):
     global LOADED_PRODUCT_OBJECTS
 
-    active_products = []
-
+    loaded = {}
+    missing = []
     for product in selected_products_set:
-        if product not in LOADED_PRODUCT_OBJECTS:
-            p = create_object(class_name, class_name.products[product]['id'])
+        p = LOADED_PRODUCT_OBJECTS.get(product)
+        if p is None:
+            missing.append(product)
         else:
-            p = LOADED_PRODUCT_OBJECTS[product]
-        active_products.append(p)
+            loaded[product] = p
+
+    created = load_all(lambda product: create_object(class_name, class_name.products[product]['id']), missing)
+    loaded.update(created)
+
+    active_products = []
+    for product in selected_products_set:
+        if product in loaded:
+            active_products.append(loaded[product])
 
     return active_products
 
+#product objects and frequency range of the session's last search
+def load_search_state(state, class_name):
+    if state == None:
+        return [], None, None
+    return manage_load(state['products'], class_name), state['low'], state['high']
+
+#load the active graphs of the first rows of a search in the background,
+#in place of the loads still queued for the session's previous search
+def prefetch_rows(class_name, searched_objects, table_data, sort_by, checklist_values, session):
+    objects = {p.name : p for p in searched_objects}
+    rows = sorted_rows(table_data, sort_by)[:PREFETCH_ROWS]
+    PREFETCHER.cancel(session)
+    PREFETCHER.prefetch([objects[row['id']] for row in rows],
+                        handle_active_figures(class_name, checklist_values), session)
+
+#measure loaded objects again once their graph data or statistics indexes have been built
+def update_loaded_sizes(products):
+    for p in products:
+        LOADED_PRODUCT_OBJECTS.resize(p.name)
+
 #given parameters, find matching products
 def search_products(class_name, inputs):
     if class_name == M:
         low_rf, high_rf, low_lo, high_lo, low_if, high_if, low_lodr, high_lodr = inputs
+        ranges = {
+            ('rf-low', 'rf-high') : (low_rf, high_rf),
+            ('lo-low', 'lo-high') : (low_lo, high_lo),
+            ('if-low', 'if-high') : (low_if, high_if),
+            ('lodr-low', 'lodr-high') : (low_lodr, high_lodr),
+        }
     else:
         low, high = inputs
+        ranges = {('freq-low', 'freq-high') : (low, high)}
 
-    data = []
-
-    for product in class_name.products.values():
-        if class_name == M:
-            if (
-                (low_rf == None or (product['rf-low'] <= low_rf and high_rf <= product['rf-high']))
-                and (low_lo == None or (product['lo-low'] <= low_lo and high_lo <= product['lo-high']))
-                and (low_if == None or (product['if-low'] <= low_if and high_if <= product['if-high']))
-                and (low_lodr == None or (product['lodr-low'] <= low_lodr and high_lodr <= product['lodr-high']))
-            ):
-                data.append(product)
-        elif (low == None or (product['freq-low'] <= low and high <= product['freq-high'])):
-            data.append(product)
-
-    return data
+    return class_name.spec_index.search(ranges)
 
 '''
 Figure handling functions
 '''
 
 #Build the multiple graphs that will be displayed together
-def generate_figures(class_name, active_products, input):
+def generate_figures(class_name, active_products, input, active_graphs, revision=None):
     graph_figures = []
-    for graph_type in ACTIVE_GRAPHS:
-        fig = create_graph(class_name, active_products, graph_type, input)
+    for graph_type in active_graphs:
+        # products whose graph could not be loaded are left out
+        products = [p for p in active_products if graph_type in p.linekeys]
+        fig = create_graph(class_name, products, graph_type, input, revision)
         if fig != None:
-            graph = html.Div([dcc.Graph(figure=fig)],
+            graph = html.Div([dcc.Graph(id={'type' : 'product-graph', 'graph' : graph_type}, figure=fig)],
                              style={
                                  'margin' : '0px'
                              },
@@ -718,74 +812,126 @@ def generate_figures(class_name, active_products, input):
     
     return graph_figures
 
-#Build individual graph
-def create_graph(class_name, active_products, graph_type, input):
-    fig = go.Figure()
-    fig.update_layout(title=dict(text=graph_type, font=dict(size=25, color=COLOR['violet'])), 
-                        font=dict(family='Roboto'),
-                        modebar_remove=['toImage', 'zoom', 'pan', 'zoomIn', 'zoomOut', 'autoScale', 'resetScale'],)
+#Build individual graph, as a plain figure dict assembled from cached traces and layouts
+#(revision: plotly's uirevision, the user's zoom is kept while the figure is updated with the same one)
+def create_graph(class_name, active_products, graph_type, input, revision=None):
+    xlow, xhigh = graph_xrange(class_name, active_products, graph_type, input)
+    trace_type = graph_trace_type(active_products, graph_type, xlow, xhigh)
+
+    data = []
+    for p in active_products:
+        data += product_traces(class_name, p, graph_type, xlow, xhigh, trace_type)
+
+    layout = graph_layout(class_name, active_products, graph_type, xlow, xhigh)
+    if revision != None:
+        layout = dict(layout, uirevision=revision)
+    fig = {'data' : data, 'layout' : layout}
+    if xlow == None: return fig, []
+    return fig
 
+#pyramid level of a line sent for the visible x range (see Curve.level)
+def line_level(line, xlow, xhigh):
+    return line.level(2 * PLOT_WIDTH, xlow, xhigh)
+
+#True if a line of the products is sent at another pyramid level in the new x window
+def levels_changed(products, graph_type, old, new):
+    if old == new:
+        return False
+    return any(line_level(line, *old) != line_level(line, *new)
+               for p in products for line in p.getdata(graph_type).values())
+
+#scatter, or scattergl for graphs sending many points
+def graph_trace_type(products, graph_type, xlow, xhigh):
+    if RENDER_MODE == 'webgl':
+        return 'scattergl'
+    if RENDER_MODE == 'svg':
+        return 'scatter'
+    points = 0
+    for p in products:
+        for label in p.getlinekeys(graph_type):
+            line = p.getdata(graph_type, label)
+            points += len(line.build_pyramid()[line_level(line, xlow, xhigh)][1])
+    return 'scattergl' if points > WEBGL_POINTS else 'scatter'
+
+#traces of every line of a product's graph
+def product_traces(class_name, p, graph_type, xlow, xhigh, trace_type='scatter'):
+    if p.color == None: p.set_color()
+
+    traces = []
+    for line_num, label in enumerate(p.getlinekeys(graph_type)):
+        level = line_level(p.getdata(graph_type, label), xlow, xhigh)
+        traces.append(graph_trace(class_name, p, graph_type, label, level, LINE_TYPES[line_num % len(LINE_TYPES)], trace_type))
+    return traces
+
+#trace of a product's line at a pyramid level
+def graph_trace(class_name, p, graph_type, label, level, dash, trace_type='scatter'):
+    key = (class_name.__name__, p.name, p.stamps.get(graph_type), graph_type, label, level, p.color, dash, trace_type)
+    trace = TRACE_CACHE.get(key)
+    if trace is None:
+        xdata, ydata = p.getdata(graph_type, label).build_pyramid()[level]
+        model = class_name.products[p.name]['model']
+        trace = {
+            'type' : trace_type,
+            'x' : plotdata.encode_array(xdata),
+            'y' : plotdata.encode_array(ydata),
+            'name' : model + ' ' + label,
+            'line' : {'color' : p.color},
+            # the product the trace belongs to, used to remove it from a shown figure
+            'meta' : p.name,
+        }
+        if len(ydata) > HOVER_TEMPLATE_POINTS:
+            trace['hoverinfo'] = 'y+name'
+        else:
+            trace['hovertemplate'] = ('<b>' + label + '</b><br>'
+                                      + '%{y:.5f} ' + class_name.graph_labels[graph_type]['yunit']
+                                      + '<extra><br><i>' + model + '</i></extra>')
+        if dash != None:
+            trace['line']['dash'] = dash
+        TRACE_CACHE[key] = trace
+    return trace
+
+#layout of a graph of products, its y range fits their data in the x range
+def graph_layout(class_name, active_products, graph_type, xlow, xhigh):
+    key = (class_name.__name__, tuple((p.name, p.stamps.get(graph_type)) for p in active_products), graph_type, xlow, xhigh)
+    layout = LAYOUT_CACHE.get(key)
+    if layout is None:
+        labels = class_name.graph_labels[graph_type]
+        layout = {
+            'title' : {'text' : graph_type, 'font' : {'size' : 25, 'color' : COLOR['violet']}},
+            'font' : {'family' : 'Roboto'},
+            'modebar' : {'remove' : ['toImage', 'zoom', 'pan', 'zoomIn', 'zoomOut', 'autoScale', 'resetScale']},
+            'legend' : {'font' : {'color' : COLOR['grey']}},
+            'xaxis' : {
+                'title' : {'text' : labels['xlabel'] + ' ' + labels['xunit'], 'font' : {'color' : COLOR['magenta']}},
+                'color' : COLOR['grey'],
+            },
+            'yaxis' : {
+                'title' : {'text' : labels['ylabel'] + ' ' + labels['yunit'], 'font' : {'color' : COLOR['magenta']}},
+                'color' : COLOR['grey'],
+            },
+        }
+        if TEMPLATE != None:
+            layout['template'] = TEMPLATE
+        if xlow != None:
+            ylow, yhigh = minmaxy(active_products, xlow, xhigh, graph_type)
+            layout['hovermode'] = 'x'
+            layout['xaxis']['range'] = [xlow, xhigh]
+            layout['yaxis']['range'] = [ylow, yhigh]
+        LAYOUT_CACHE[key] = layout
+    return layout
+
+#x range shown by a graph: the searched range, or the data's for the mixers' IF response
+def graph_xrange(class_name, active_products, graph_type, input):
     if class_name == M:
         low, high, low_if_i, high_if_i = input
     else:
         low, high = input
 
-
-    for p in active_products:
-        lines = p.getlinekeys(graph_type)
-
-        line_types=[None, 'dash', 'dashdot', 'dot']
-
-        if p.color == None: p.set_color()
-
-        line_num = 0
-        for label in lines:
-            fig.add_trace( go.Scatter(
-                                x=p.getdata(graph_type, label)['xdata'], 
-                                y=p.getdata(graph_type, label)['ydata'],
-                                name=class_name.products[p.name]['model']+' '+label,
-                                hovertemplate = '<b>' + label + '</b><br>'
-                                                + '%{y:.5f} ' + class_name.graph_labels[graph_type]['yunit'] 
-                                                + '<extra><br><i>'+class_name.products[p.name]['model']+'</i></extra>',
-                                line=dict(color=p.color,
-                                            dash=line_types[line_num],
-                                            ) 
-                                        )
-                            )
-            line_num += 1
-            if line_num >= len(line_types): line_num = 0                                
-
-    fig.update_layout(
-        legend=dict(
-            font= dict(
-                color=COLOR['grey']
-            )
-        ),
-        xaxis=dict(
-            title=dict(
-                text= class_name.graph_labels[graph_type]['xlabel'] + ' ' + class_name.graph_labels[graph_type]['xunit'],
-                font= dict(
-                    color=COLOR['magenta']
-                ),
-            ),
-            color=COLOR['grey']
-        ),
-        yaxis=dict(
-            title=dict(
-                text= class_name.graph_labels[graph_type]['ylabel'] + ' ' + class_name.graph_labels[graph_type]['yunit'],
-                font= dict(
-                    color=COLOR['magenta']
-                ),
-            ),
-            color=COLOR['grey']
-        ),
-    ) 
-
     if class_name == M and graph_type == M.graph_options[m.IF_R_INDEX]:
         xlow,xhigh = minmaxx(active_products, graph_type)
     else:
         xlow, xhigh = low, high
-    if xlow == None: return fig, []
+    if xlow == None: return xlow, xhigh
 
     if class_name == M and graph_type == M.graph_options[m.IF_R_INDEX]:
         if low_if_i != None and xlow < low_if_i: xlow = low_if_i
@@ -794,24 +940,11 @@ def create_graph(class_name, active_products, graph_type, input):
         if low != None and xlow < low: xlow = low
         if high != None and high < xhigh: xhigh = high
 
-    ylow, yhigh = minmaxy(active_products, xlow, xhigh, graph_type)
-    
-    fig.update_layout(
-        hovermode="x",
-        xaxis=dict(range=[xlow, xhigh]),
-        yaxis=dict(range=[ylow, yhigh]),
-    )
-        
-    return fig
+    return xlow, xhigh
 
 #From settings, determin which graphs should be displayed
 def handle_active_figures(class_name, checklist_values):
-    global ACTIVE_GRAPHS
-
-    ACTIVE_GRAPHS.clear()
-    for value in checklist_values:
-        ACTIVE_GRAPHS.append(value)
-    ACTIVE_GRAPHS = sort_list(ACTIVE_GRAPHS, class_name.graph_options)
+    return sort_list(checklist_values, class_name.graph_options)
 
 '''
 Interactivity
@@ -843,11 +976,102 @@ def settings_toggle(clicks):
 def reset_inputs(clicks):
     return None, None, None, None, None, None, None, None, None, None
 
+#x range of a graph zoomed into from its relayoutData: [x0, x1], None when the zoom was reset,
+#False when the x axis did not change (the graph was resized, or zoomed along y only)
+def relayout_xrange(relayout):
+    if not relayout:
+        return False
+    if 'xaxis.range[0]' in relayout and 'xaxis.range[1]' in relayout:
+        return sorted([float(relayout['xaxis.range[0]']), float(relayout['xaxis.range[1]'])])
+    if 'xaxis.range' in relayout:
+        return sorted(float(v) for v in relayout['xaxis.range'])
+    if relayout.get('xaxis.autorange'):
+        return None
+    return False
+
+#what a set of graphs shows: the settings they were drawn with, and per graph
+#its products (in trace order), x range, trace type and the x range it is zoomed into;
+#revision is the uirevision of the figures
+def graph_view(tab, active_graphs, input, shown, xranges, trace_types, zooms, revision):
+    return {
+        'tab' : tab,
+        'graphs' : active_graphs,
+        'inputs' : list(input),
+        'shown' : shown,
+        'xranges' : xranges,
+        'trace_types' : trace_types,
+        'zooms' : zooms,
+        'revision' : revision,
+    }
+
+#view of the graphs of products, with the zoomed x ranges of zooms
+def products_view(class_name, tab, active_graphs, input, active_products, zooms, revision):
+    shown = {}
+    xranges = {}
+    trace_types = {}
+    for graph_type in active_graphs:
+        products = [p for p in active_products if graph_type in p.linekeys]
+        shown[graph_type] = [p.name for p in products]
+        xlow, xhigh = graph_xrange(class_name, products, graph_type, input)
+        xranges[graph_type] = [xlow, xhigh]
+        xlow, xhigh = zooms.get(graph_type, [xlow, xhigh])
+        trace_types[graph_type] = graph_trace_type(products, graph_type, xlow, xhigh)
+    zooms = {graph_type : zoom for graph_type, zoom in zooms.items() if graph_type in active_graphs}
+    return graph_view(tab, active_graphs, input, shown, xranges, trace_types, zooms, revision)
+
+#x range a graph of a view shows: the one it is zoomed into, or its own
+def graph_window(view, graph_type):
+    return view['zooms'].get(graph_type, view['xranges'][graph_type])
+
+#changes turning the graphs of cur_view into those of view: per graph, the products whose traces
+#are removed, the traces added and the new layout; None if the graphs have to be drawn again
+def graph_delta(class_name, cur_view, view, active_products):
+    if not cur_view or any(cur_view.get(k) != view[k] for k in ('tab', 'graphs', 'inputs', 'xranges', 'revision')):
+        return None
+
+    delta = {}
+    for graph_type in view['graphs']:
+        shown = cur_view['shown'][graph_type]
+        names = view['shown'][graph_type]
+        products = [p for p in active_products if p.name in names]
+        window = graph_window(view, graph_type)
+        trace_type = view['trace_types'][graph_type]
+        kept = [name for name in shown if name in names]
+        # a zoom that changes the level of detail sent (or a switch between svg and webgl) replaces every trace
+        if (trace_type != cur_view['trace_types'][graph_type]
+                or levels_changed([p for p in products if p.name in kept], graph_type, graph_window(cur_view, graph_type), window)):
+            removed, added = shown, names
+        else:
+            added = [name for name in names if name not in shown]
+            # new products are drawn last, any other order needs new graphs
+            if names != kept + added:
+                return None
+            removed = [name for name in shown if name not in names]
+        if not removed and not added:
+            continue
+
+        xlow, xhigh = view['xranges'][graph_type]
+        layout = graph_layout(class_name, products, graph_type, xlow, xhigh)
+        delta[graph_type] = {
+            'remove' : removed,
+            'add' : [trace for p in products if p.name in added
+                     for trace in product_traces(class_name, p, graph_type, window[0], window[1], trace_type)],
+            # the template the figure already has is kept, the user's zoom too (same uirevision)
+            'layout' : dict({k : v for k, v in layout.items() if k != 'template'}, uirevision=view['revision']),
+        }
+    return delta
+
 #Selecting products on table updates graphs
+#when only the selection changed, the shown graphs get the traces to add and remove (graph-delta)
+#instead of being drawn again; zooming into a graph sends its traces again, with the level of
+#detail of the zoomed x range
 @app.callback(
     Output('graphs', 'children'),
+    Output('graph-delta', 'data'),
+    Output('graph-view', 'data'),
     Input('settings-checklist', 'value'),
     Input('products-table', 'selected_row_ids'),
+    Input({'type' : 'product-graph', 'graph' : ALL}, 'relayoutData'),
     dash.dependencies.State('search-tabs', 'value'),
     dash.dependencies.State('low-rf-input', 'value'),
     dash.dependencies.State('high-rf-input', 'value'),
@@ -857,8 +1081,9 @@ def reset_inputs(clicks):
     dash.dependencies.State('high-if-input', 'value'),
     dash.dependencies.State('low-freq-input', 'value'),
     dash.dependencies.State('high-freq-input', 'value'),
+    dash.dependencies.State('graph-view', 'data'),
 )
-def update_graph(checklist_values, selected_products, tab, low_rf_i, high_rf_i, low_lo_i, high_lo_i, low_if_i, high_if_i, low_freq_i, high_freq_i):
+def update_graph(checklist_values, selected_products, relayouts, tab, low_rf_i, high_rf_i, low_lo_i, high_lo_i, low_if_i, high_if_i, low_freq_i, high_freq_i, cur_view):
     if tab == 'm':
         classname = M
         low, high = mixer_true_rflo_range(low_rf_i, high_rf_i, low_lo_i, high_lo_i)
@@ -875,21 +1100,86 @@ def update_graph(checklist_values, selected_products, tab, low_rf_i, high_rf_i,
         elif tab == 'b':
             classname = B
     
-    handle_active_figures(classname, checklist_values)
+    active_graphs = handle_active_figures(classname, checklist_values)
+
+    # graphs keep their zoom while only the selection changes
+    zooms = dict(cur_view['zooms']) if cur_view else {}
+    triggered = [t for t in dash.callback_context.triggered if t['prop_id'] != '.']
+    relayouted = [t for t in triggered if t['prop_id'].endswith('.relayoutData')]
+    for t in relayouted:
+        graph_type = json.loads(t['prop_id'].rsplit('.', 1)[0])['graph']
+        xrange = relayout_xrange(t['value'])
+        if xrange is False or not cur_view or graph_type not in cur_view['graphs']:
+            continue
+        if xrange is None:
+            zooms.pop(graph_type, None)
+        else:
+            zooms[graph_type] = xrange
+    # relayout events without an x range (autosize, y axis zoom) or with the same one change nothing
+    if relayouted and len(relayouted) == len(triggered) and zooms == (cur_view['zooms'] if cur_view else {}):
+        return dash.no_update, dash.no_update, dash.no_update
 
-    selected_products_set = set(selected_products or [])
-
-    if selected_products_set == []:
-        return None
+    # selection order, without repeats
+    # (no early return for an empty selection: its graphs are drawn empty, as they always were)
+    selected_products_set = list(dict.fromkeys(selected_products or []))
 
     active_products = manage_load(selected_products_set, classname)
 
     if low == None and high == None:
-        return []
-
-    graph_figures = generate_figures(classname, active_products, inputs)
-    
-    return graph_figures
+        return [], None, None
+
+    # the products' graphs are loaded concurrently (waiting for prefetched ones),
+    # a product that fails or times out is left out of the figures
+    active_products = [p for p, result in load_all(lambda p: load_graphs(p, active_graphs), active_products)]
+    update_loaded_sizes(active_products)
+
+    revision = cur_view['revision'] if cur_view else None
+    view = products_view(classname, tab, active_graphs, inputs, active_products, zooms, revision)
+
+    # graphs without an x range are drawn again (create_graph returns no usable figure for them)
+    if all(xlow != None for xlow, xhigh in view['xranges'].values()):
+        delta = graph_delta(classname, cur_view, view, active_products)
+        if delta == {}:
+            # nothing to draw (the call new graphs make when they appear, a pan or zoom at the same
+            # level of detail), only the zooms kept in the view may have changed
+            return dash.no_update, dash.no_update, view if view != cur_view else dash.no_update
+        if delta != None:
+            return dash.no_update, delta, view
+
+    # new graphs start unzoomed, their new uirevision makes plotly drop the zoom of the ones they replace
+    revision = uuid.uuid4().hex
+    view = products_view(classname, tab, active_graphs, inputs, active_products, {}, revision)
+    graph_figures = generate_figures(classname, active_products, inputs, active_graphs, revision)
+    # the last delta must not stay in the store, it belongs to the graphs replaced here
+    return graph_figures, None, view
+
+#apply a graph-delta to the shown figures
+app.clientside_callback(
+    """
+    function(delta, figures, ids) {
+        if (!delta || !Object.keys(delta).length) {
+            throw window.dash_clientside.PreventUpdate;
+        }
+        return figures.map(function(figure, i) {
+            var change = delta[ids[i].graph];
+            if (!change || !figure) {
+                return figure;
+            }
+            var data = figure.data.filter(function(trace) {
+                return change.remove.indexOf(trace.meta) < 0;
+            });
+            var layout = Object.assign({}, change.layout, {template: figure.layout.template});
+            return {data: data.concat(change.add), layout: layout};
+        });
+    }
+    """,
+    Output({'type' : 'product-graph', 'graph' : ALL}, 'figure'),
+    Input('graph-delta', 'data'),
+    dash.dependencies.State({'type' : 'product-graph', 'graph' : ALL}, 'figure'),
+    dash.dependencies.State({'type' : 'product-graph', 'graph' : ALL}, 'id'),
+    # new graphs come with their figures, a delta is never applied to them when they appear
+    prevent_initial_call=True,
+)
 
 # user interactions that change product table
 @app.callback(
@@ -901,6 +1191,7 @@ def update_graph(checklist_values, selected_products, tab, low_rf_i, high_rf_i,
     Output('products-table', 'sort_by'),
     Output('products-table', 'style_data_conditional'),
     Output('products-table', 'hidden_columns'),
+    Output('search-state', 'data'),
 
     Input('search-button', 'n_clicks'),
     Input('sort-options', 'value'),
@@ -913,6 +1204,7 @@ def update_graph(checklist_values, selected_products, tab, low_rf_i, high_rf_i,
     dash.dependencies.State('products-table', 'data'),
     dash.dependencies.State('products-table', 'style_data_conditional'),
     dash.dependencies.State('products-table', 'hidden_columns'),
+    dash.dependencies.State('search-state', 'data'),
     #inputs
     dash.dependencies.State('low-rf-input', 'value'),
     dash.dependencies.State('high-rf-input', 'value'),
@@ -926,7 +1218,7 @@ def update_graph(checklist_values, selected_products, tab, low_rf_i, high_rf_i,
     dash.dependencies.State('high-freq-input', 'value'),
 )
 def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
-                   cur_sel_rows, cur_sel_ids, tab, cur_data, cur_style, cur_hidden,
+                   cur_sel_rows, cur_sel_ids, tab, cur_data, cur_style, cur_hidden, cur_state,
                    low_rf_i, high_rf_i, low_lo_i, high_lo_i, low_if_i, high_if_i, low_lodr_i, high_lodr_i, low_freq_i, high_freq_i):
     
     output_data = cur_data
@@ -937,12 +1229,13 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
     output_sort_by = cur_sort_by
     output_style = cur_style
     output_hidden = cur_hidden
+    output_state = cur_state
 
     ctx = dash.callback_context
 
     if not ctx.triggered:
         return (output_data, output_selected_rows, output_selected_ids, output_error, 
-                output_error_display, output_sort_by, output_style, output_hidden)
+                output_error_display, output_sort_by, output_style, output_hidden, output_state)
     else:
         input_id = ctx.triggered[0]['prop_id'].split('.')[0]
 
@@ -961,7 +1254,7 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
                 high_lodr_i == None
             ):
                 return ([], [], [], output_error, output_error_display, 
-                        output_sort_by, output_style, output_hidden)
+                        output_sort_by, output_style, output_hidden, output_state)
 
             inputs = mixer_true_input_values(low_rf_i, high_rf_i, low_lo_i, high_lo_i, low_if_i, high_if_i, low_lodr_i, high_lodr_i)
 
@@ -975,13 +1268,13 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
                 (low_lodr != None and low_lodr > high_lodr)):
 
                 return ([],[],[],'ENTER VALID LOW TO HIGH RANGE', True, 
-                        output_sort_by, output_style, output_hidden)
+                        output_sort_by, output_style, output_hidden, output_state)
 
             classname = M
         else:
             if (low_freq_i == None and high_freq_i == None):
                 return ([], [], [], output_error, output_error_display, 
-                        output_sort_by, output_style, output_hidden)
+                        output_sort_by, output_style, output_hidden, output_state)
 
             inputs = true_input_values(low_freq_i, high_freq_i)
 
@@ -989,7 +1282,7 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
 
             if (low_freq != None and low_freq > high_freq):
                 return ([],[],[],'ENTER VALID LOW TO HIGH RANGE', True, 
-                        output_sort_by, output_style, output_hidden)
+                        output_sort_by, output_style, output_hidden, output_state)
             
             if tab == 'a':
                 classname = A
@@ -1000,9 +1293,6 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
             elif tab == 'b':
                 classname = B
 
-        global LOW_FREQ,HIGH_FREQ
-        LOW_FREQ, HIGH_FREQ = low_freq, high_freq
-
         products = search_products(classname, inputs)
 
         product_ids = []
@@ -1011,8 +1301,8 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
             product_ids.append(p['id'])
 
         searched_objects = manage_load(product_ids, classname)
-        global SEARCHED_PRODUCT_OBJECTS
-        SEARCHED_PRODUCT_OBJECTS = searched_objects
+        session = cur_state['session'] if cur_state and 'session' in cur_state else uuid.uuid4().hex
+        output_state = {'products' : product_ids, 'low' : low_freq, 'high' : high_freq, 'session' : session}
 
         if tab == 'm':
             products_table_data = m_table_data(searched_objects, sort_value, low_freq, high_freq)
@@ -1024,9 +1314,11 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
             products_table_data = co_table_data(searched_objects, low_freq, high_freq)
         elif tab == 'b':
             products_table_data = ba_table_data(searched_objects, low_freq, high_freq)
+        update_loaded_sizes(searched_objects)
+        prefetch_rows(classname, searched_objects, products_table_data, output_sort_by, checklist_values, session)
 
-        return (products_table_data, [],[], output_error, output_error_display, 
-                output_sort_by, output_style, output_hidden)
+        return (plotdata.round_rows(products_table_data), [],[], output_error, output_error_display, 
+                output_sort_by, output_style, output_hidden, output_state)
 
     # radio button or table sort interact
     elif input_id == 'sort-options' or input_id == 'products-table':
@@ -1064,7 +1356,9 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
                         {'if': {'column_id': col},'backgroundColor': COLOR['blue'],},
                         #{'if': {'column_id': 'datasheet'},'color': COLOR['blue'],'fontStyle': 'italic', 'textDecoration': 'underline'},
                         ]
-            output_data = m_table_data(SEARCHED_PRODUCT_OBJECTS, sort_value, LOW_FREQ, HIGH_FREQ)
+            searched_objects, low_freq, high_freq = load_search_state(cur_state, M)
+            output_data = plotdata.round_rows(m_table_data(searched_objects, sort_value, low_freq, high_freq))
+            update_loaded_sizes(searched_objects)
             if 'p1db' not in checklist_values:
                 output_hidden.append('p1db')
         elif tab == 'a':
@@ -1084,7 +1378,9 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
                         {'if': {'column_id': col},'backgroundColor': COLOR['blue'],},
                         #{'if': {'column_id': 'datasheet'},'color': COLOR['blue'],'fontStyle': 'italic', 'textDecoration': 'underline'},
                         ]
-            output_data = pd_table_data(SEARCHED_PRODUCT_OBJECTS, LOW_FREQ, HIGH_FREQ)
+            searched_objects, low_freq, high_freq = load_search_state(cur_state, PD)
+            output_data = plotdata.round_rows(pd_table_data(searched_objects, low_freq, high_freq))
+            update_loaded_sizes(searched_objects)
         elif tab == 'co':
             output_sort_by=[{'column_id': 'model','direction': 'asc'}]
             output_style=cur_style
@@ -1115,7 +1411,7 @@ def table_interact(n_clicks, sort_value, cur_sort_by, checklist_values,
                 output_hidden.append('p1db')
 
     return (output_data, output_selected_rows, output_selected_ids, output_error,
-            output_error_display, output_sort_by, output_style, output_hidden)
+            output_error_display, output_sort_by, output_style, output_hidden, output_state)
 
 
 '''
@@ -1125,11 +1421,17 @@ Product Functions
 # gather info to put on product datatable
 def ba_table_data(searched_objects, low, high):
     product_table_data = []
-    for p in searched_objects:
+
+    if False and low != high:
+        il_stats = B.batch_ystats(searched_objects, balun.IL, low, high)
+        ab_stats = B.batch_ystats(searched_objects, balun.AMP_B, low, high)
+        pb_stats = B.batch_ystats(searched_objects, balun.PH_B, low, high)
+
+    for i, p in enumerate(searched_objects):
         d = p.get_col_data()
 
         if False and low != high:
-            min,max,med,bmin,bmax,bmed = p.getystats(low,high, balun.IL)
+            min,max,med,bmin,bmax,bmed = il_stats[i]
             if min == None:
                 d['il-min'] = '---'
                 d['il-max'] = '---'
@@ -1146,12 +1448,12 @@ def ba_table_data(searched_objects, low, high):
                 d['il-med'] = f'{med:.2f} ({bmed:.2f})'
                 d['il-med-v'] = med
 
-            min,max,med,bmin,bmax,bmed = p.getystats(low,high, balun.AMP_B)
+            min,max,med,bmin,bmax,bmed = ab_stats[i]
             d['ab-min'] = min
             d['ab-max'] = max
             d['ab-med'] = med
 
-            min,max,med,bmin,bmax,bmed = p.getystats(low,high, balun.PH_B)
+            min,max,med,bmin,bmax,bmed = pb_stats[i]
             d['pb-min'] = min
             d['pb-max'] = max
             d['pb-med'] = med
@@ -1188,11 +1490,17 @@ def co_table_data(searched_objects, low, high):
 # gather info to put on product datatable
 def pd_table_data(searched_objects, low, high):
     product_table_data = []
-    for p in searched_objects:
+
+    if low != high:
+        il_stats = PD.batch_ystats(searched_objects, powdiv.IL, low, high)
+        ab_stats = PD.batch_ystats(searched_objects, powdiv.AMP_B, low, high)
+        pb_stats = PD.batch_ystats(searched_objects, powdiv.PH_B, low, high)
+
+    for i, p in enumerate(searched_objects):
         d = p.get_col_data()
 
         if low != high:
-            min,max,med,bmin,bmax,bmed = p.getystats(low,high, powdiv.IL)
+            min,max,med,bmin,bmax,bmed = il_stats[i]
             if min == None:
                 d['il-min'] = '---'
                 d['il-max'] = '---'
@@ -1209,12 +1517,12 @@ def pd_table_data(searched_objects, low, high):
                 d['il-med'] = f'{med:.2f} ({bmed:.2f})'
                 d['il-med-v'] = med
 
-            min,max,med,bmin,bmax,bmed = p.getystats(low,high, powdiv.AMP_B)
+            min,max,med,bmin,bmax,bmed = ab_stats[i]
             d['ab-min'] = min
             d['ab-max'] = max
             d['ab-med'] = med
 
-            min,max,med,bmin,bmax,bmed = p.getystats(low,high, powdiv.PH_B)
+            min,max,med,bmin,bmax,bmed = pb_stats[i]
             d['pb-min'] = min
             d['pb-max'] = max
             d['pb-med'] = med
@@ -1252,12 +1560,20 @@ def amp_table_data(searched_objects, low, high):
 def m_table_data(searched_mixer_objects, sort, low, high):
     product_table_data = []
 
-    for p in searched_mixer_objects:
+    if low != high:
+        if sort == 'll' or sort == 'mn':
+            ystats = M.batch_ystats(searched_mixer_objects, M.graph_options[m.CL_INDEX], low, high)
+        elif sort == 'bl':
+            ystats = M.batch_ystats(searched_mixer_objects, M.graph_options[m.IIP3_INDEX], low, high)
+        elif sort == 'bi':
+            ystats = M.batch_ystats(searched_mixer_objects, M.graph_options[m.LORF_ISO_INDEX], low, high)
+
+    for i, p in enumerate(searched_mixer_objects):
         d = p.get_col_data()
 
         if low != high:
             if sort == 'll' or sort == 'mn':
-                min,max,med,bmin,bmax,bmed = p.getystats(low,high, M.graph_options[m.CL_INDEX])
+                min,max,med,bmin,bmax,bmed = ystats[i]
                 if min == None:
                     d['cl-min'] = '---'
                     d['cl-max'] = '---'
@@ -1274,7 +1590,7 @@ def m_table_data(searched_mixer_objects, sort, low, high):
                     d['cl-med'] = f'{med:.1f} ({bmed:.1f})'
                     d['cl-med-v'] = med
             elif sort == 'bl':
-                min,max,med,bmin,bmax,bmed = p.getystats(low,high, M.graph_options[m.IIP3_INDEX])
+                min,max,med,bmin,bmax,bmed = ystats[i]
                 if min == None:
                     d['iip3-min'] = '---'
                     d['iip3-max'] = '---'
@@ -1291,7 +1607,7 @@ def m_table_data(searched_mixer_objects, sort, low, high):
                     d['iip3-med'] = f'{med:.0f} ({bmed:.0f})'
                     d['iip3-med-v'] = med
             elif sort == 'bi':
-                min,max,med,bmin,bmax,bmed = p.getystats(low,high, M.graph_options[m.LORF_ISO_INDEX])
+                min,max,med,bmin,bmax,bmed = ystats[i]
                 if min == None:
                     d['lr-iso-min'] = '---'
                     d['lr-iso-max'] = '---'
@@ -0,0 +1,130 @@
+'''
+Curve store shared by the gunicorn workers through /dev/shm.
+
+The first worker to load a product's graph from its excel or touchstone file
+publishes the curves as a blob file (same layout as the catalog, see
+catalog.write_blob) under SHM_DIR. The other workers memory-map that file
+instead of reading the source again, so they all share the same physical
+pages and only one of them pays for the load.
+
+A blob holds one graph of one product and records the mtime/size of the
+source file it was read from; it is ignored (and overwritten on the next
+publish) once the source changes.
+
+The store holds at most PRODUCTSEARCH_SHM_MB (default 48, under the 64 MB
+/dev/shm of a default Docker container): before a publish the least recently
+used blobs are deleted until the new one fits, with the temporary files left
+by crashed writers. Workers that have a deleted blob mapped keep using it.
+
+Set PRODUCTSEARCH_SHM to the directory to use, or to 'off' to disable.
+'''
+
+import os
+import time
+import hashlib
+import tempfile
+import numpy
+import catalog
+from cache import budget_from_env
+from curve import Curve, to_float_array
+
+def default_dir():
+    if os.path.isdir('/dev/shm'):
+        return os.path.join('/dev/shm', 'productsearch')
+    return os.path.join(tempfile.gettempdir(), 'productsearch')
+
+SHM_DIR = os.environ.get('PRODUCTSEARCH_SHM', default_dir())
+SHM_BYTES = budget_from_env('PRODUCTSEARCH_SHM_MB', 48)
+
+#temporary files older than this are left by writers that died
+STALE_TMP_SECONDS = 600
+
+def enabled():
+    return SHM_DIR != 'off'
+
+#blob file of a product's graph
+def blob_path(product, graph):
+    key = '\0'.join([type(product).__name__, str(product.name), graph])
+    return os.path.join(SHM_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.bin')
+
+#get (data, linekeys) of a product's graph published by any worker, None if absent or stale
+def load_graph(product, graph):
+    if not enabled() or product.source is None:
+        return None
+    path = blob_path(product, graph)
+    try:
+        header, values = catalog.open_blob(path)
+    except (OSError, ValueError):
+        return None
+    if header['source'] != product.source or not catalog.is_fresh(product.source, header['stamp']):
+        return None
+    try:
+        # recently used blobs are the last ones pruned
+        os.utime(path)
+    except OSError:
+        pass
+
+    data = {}
+    linekeys = []
+    for label, xoffset, xlength, yoffset, ylength in header['lines']:
+        data[label] = Curve(values[xoffset:xoffset + xlength], values[yoffset:yoffset + ylength], numpy.float64)
+        linekeys.append(label)
+    return data, linekeys
+
+#publish a loaded graph for the other workers, under the stamp its source had before it was read
+def publish(product, graph):
+    stamp = product.stamps.get(graph)
+    if not enabled() or product.source is None or stamp is None or graph not in product.data:
+        return
+    lines = []
+    chunks = []
+    offset = 0
+    for label in product.linekeys[graph]:
+        x = to_float_array(product.data[graph][label].x)
+        y = to_float_array(product.data[graph][label].y)
+        lines.append([label, offset, len(x), offset + len(x), len(y)])
+        chunks += [x, y]
+        offset += len(x) + len(y)
+    values = numpy.concatenate(chunks) if chunks else numpy.zeros(0)
+    header = {'source' : product.source, 'stamp' : stamp, 'lines' : lines}
+    # values and a generous allowance for the header
+    size = values.nbytes + 4096
+    if size > SHM_BYTES:
+        return
+    try:
+        os.makedirs(SHM_DIR, exist_ok=True)
+        prune(size)
+        catalog.write_blob(blob_path(product, graph), header, values)
+    except OSError:
+        # the store is only an optimisation, a full /dev/shm must not fail the request
+        pass
+
+#delete stale temporary files, and the least recently used blobs until room bytes fit in SHM_BYTES
+def prune(room):
+    files = []
+    now = time.time()
+    for entry in os.scandir(SHM_DIR):
+        try:
+            st = entry.stat()
+        except OSError:
+            # deleted by another worker
+            continue
+        if entry.name.endswith('.tmp'):
+            if now - st.st_mtime > STALE_TMP_SECONDS:
+                remove(entry.path)
+            else:
+                room += st.st_size
+        elif entry.name.endswith('.bin'):
+            files.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for mtime, size, path in files) + room
+    for mtime, size, path in sorted(files):
+        if total <= SHM_BYTES:
+            break
+        remove(path)
+        total -= size
+
+def remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
@@ -25,6 +25,7 @@ Functions related to reading/writing touchstones.
 
 """
 import re
+import warnings
 import numpy
 import numpy as npy
 
@@ -44,7 +45,7 @@ class Touchstone:
     .. [#] https://ibis.org/interconnect_wip/touchstone_spec2_draft.pdf
     .. [#] https://ibis.org/touchstone_ver2.0/touchstone_ver2_0.pdf
     """
-    def __init__(self, file):
+    def __init__(self, file, fast=True, lazy=False):
         """
         constructor
 
@@ -52,6 +53,12 @@ class Touchstone:
         ----------
         file : str or file-object
             touchstone file to load
+        fast : bool
+            parse the numeric block in bulk instead of line by line
+        lazy : bool
+            only read the header and comments now, the numeric block is
+            parsed on the first access to `sparameters` or `noise`
+            (needs a file name, or a file object that can be reopened by name)
 
         Examples
         --------
@@ -88,9 +95,19 @@ class Touchstone:
         self.reference = None
 
         ## numpy array of original s-parameter data
-        self.sparameters = None
+        self._sparameters = None
+        ## s-parameter name (S11, S21, ...) -> its first column in sparameters
+        self._sparam_columns = None
+        ## (name, format) -> converted column pair, filled by `sparam`
+        self._sparam_cache = {}
+        ## frequency vector in Hz, filled by `get_frequency`
+        self._frequency = None
         ## numpy array of original noise data
-        self.noise = None
+        self._noise = None
+        ## True once the numeric block has been parsed
+        self.data_loaded = False
+        ## position of the first data line in the file
+        self.data_offset = None
 
         ## kind of s-parameter data (s1p, s2p, s3p, s4p)
         self.rank = None
@@ -98,21 +115,59 @@ class Touchstone:
         self.port_names = None
 
         self.comment_variables=None
-        self.load_file(fid)
 
         self.gamma = []
         self.z0 = []
 
-        if self.is_from_hfss:
-            self.get_gamma_z0_from_fid(fid)
+        ## parse the numeric block in bulk
+        self.fast = fast
+        ## defer parsing the numeric block to its first use
+        self.lazy = lazy
+        self.load_file(fid)
 
         fid.close()
 
 
+    @property
+    def sparameters(self):
+        """
+        numpy array of original s-parameter data, parsed on first access
+        for lazy objects
+        """
+        if not self.data_loaded:
+            self.load_data()
+        return self._sparameters
+
+    @sparameters.setter
+    def sparameters(self, value):
+        self._sparameters = value
+        self._sparam_cache = {}
+        self._frequency = None
+
+    @property
+    def noise(self):
+        """
+        numpy array of original noise data, parsed on first access for
+        lazy objects
+        """
+        if not self.data_loaded:
+            self.load_data()
+        return self._noise
+
+    @noise.setter
+    def noise(self, value):
+        self._noise = value
+
+
     def load_file(self, fid):
         """
         Load the touchstone file into the internal data structures.
 
+        The header, option line and comments are parsed line by line. With
+        `fast` enabled, the numeric block following the header is then
+        converted to floats in one pass instead of token by token, and with
+        `lazy` enabled it is left for `load_data`.
+
         Parameters
         ----------
         fid : file object
@@ -137,10 +192,82 @@ class Touchstone:
             raise Exception('Filename does not have the expected Touchstone extension (.sNp or .ts)')
 
         values = []
-        while True:
-            line = fid.readline()
-            if not line:
-                break
+        if self.fast or self.lazy:
+            self.data_offset = self.parse_lines(iter_file_lines(fid), values, header_only=True)
+        else:
+            self.parse_lines(iter_lines(fid.read()), values)
+
+        # multiplier from the frequency unit
+        self.frequency_mult = {'hz':1.0, 'khz':1e3,
+                               'mhz':1e6, 'ghz':1e9}.get(self.frequency_unit)
+        # set the reference to the resistance value if no [reference] is provided
+        if not self.reference:
+            self.reference = [self.resistance] * self.rank
+
+        if self.lazy:
+            return
+        if self.fast:
+            self.load_data(fid)
+        else:
+            self.load_values(values)
+            if self.is_from_hfss():
+                self.get_gamma_z0_from_fid(fid)
+
+
+    def load_data(self, fid=None):
+        """
+        Parse the numeric block of the touchstone file.
+
+        Called by `load_file`, or on first access to the data of a lazy
+        object, in which case the file is opened again.
+
+        Parameters
+        ----------
+        fid : file object, optional
+            open touchstone file
+
+        """
+        close = fid is None
+        if close:
+            fid = get_fid(self.filename)
+        try:
+            if self.data_offset is None:
+                values = []
+            else:
+                fid.seek(self.data_offset)
+                values = self.parse_values(fid.read())
+            self.load_values(values)
+            if self.is_from_hfss():
+                self.get_gamma_z0_from_fid(fid)
+        finally:
+            if close:
+                fid.close()
+
+
+    def parse_lines(self, lines, values, header_only=False):
+        """
+        Parse touchstone lines one at a time.
+
+        Comments, keywords and the option line are stored on the object and
+        the numbers of the data lines are appended to `values`.
+
+        Parameters
+        ----------
+        lines : iterator
+            (offset, line) tuples, as returned by `iter_lines`
+        values : list
+            list the data values are appended to
+        header_only : bool
+            stop at the first data line
+
+        Returns
+        -------
+        offset : int or None
+            offset of the first data line if `header_only` stopped there,
+            None otherwise
+
+        """
+        for offset, line in lines:
             # store comments if they precede the option line
             line = line.split('!',1)
             if len(line) == 2:
@@ -148,20 +275,8 @@ class Touchstone:
                     if self.comments == None:
                         self.comments = ''
                     self.comments = self.comments + line[1]
-                elif line[1].startswith(' Port['):
-                    try:
-                        port_string, name = line[1].split('=', 1) #throws ValueError on unpack
-                        name = name.strip()
-                        garbage, index = port_string.strip().split('[', 1) #throws ValueError on unpack
-                        index = int(index.rstrip(']')) #throws ValueError on not int-able
-                        if index > self.rank or index <= 0:
-                            print("Port name {0} provided for port number {1} but that's out of range for a file with extension s{2}p".format(name, index, self.rank))
-                        else:
-                            if self.port_names is None: #Initialize the array at the last minute
-                                self.port_names = [''] * self.rank
-                            self.port_names[index - 1] = name
-                    except ValueError as e:
-                        print("Error extracting port names from line: {0}".format(line))
+                else:
+                    self.parse_port_name(line[1])
 
             # remove the comment (if any) so rest of line can be processed.
             # touchstone files are case-insensitive
@@ -182,7 +297,7 @@ class Touchstone:
                 # or on the following line
                 self.reference = [ float(r) for r in line.split()[2:] ]
                 if not self.reference:
-                    line = fid.readline()
+                    line = next(lines, (None, ''))[1]
                     self.reference = [ float(r) for r in line.split()]
                 continue
             
@@ -225,10 +340,91 @@ class Touchstone:
 
                 continue
 
+            if header_only:
+                return offset
+
             # collect all values without taking care of there meaning
             # we're separating them later
             values.extend([ float(v) for v in line.split() ])
 
+        return None
+
+
+    def parse_port_name(self, comment):
+        """
+        Store the port name given by a ` Port[n] = name` comment.
+
+        Parameters
+        ----------
+        comment : str
+            comment text following the '!'
+
+        """
+        if not comment.startswith(' Port['):
+            return
+        try:
+            port_string, name = comment.split('=', 1) #throws ValueError on unpack
+            name = name.strip()
+            garbage, index = port_string.strip().split('[', 1) #throws ValueError on unpack
+            index = int(index.rstrip(']')) #throws ValueError on not int-able
+            if index > self.rank or index <= 0:
+                print("Port name {0} provided for port number {1} but that's out of range for a file with extension s{2}p".format(name, index, self.rank))
+            else:
+                if self.port_names is None: #Initialize the array at the last minute
+                    self.port_names = [''] * self.rank
+                self.port_names[index - 1] = name
+        except ValueError as e:
+            print("Error extracting port names from line: {0}".format(comment))
+
+
+    def parse_values(self, block):
+        """
+        Convert the numeric block of a touchstone file in one pass.
+
+        Comments inside the block are checked for port names and removed.
+        Blocks containing keywords fall back to `parse_lines`.
+
+        Parameters
+        ----------
+        block : str
+            text of the file from the first data line on
+
+        Returns
+        -------
+        values : numpy.ndarray
+            all numbers of the block
+
+        """
+        if '[' in block:
+            values = []
+            self.parse_lines(iter_lines(block), values)
+            return values
+
+        if '!' in block:
+            for comment in re.findall(r'!(.*)', block):
+                self.parse_port_name(comment)
+            block = re.sub(r'!.*', '', block)
+
+        # numpy.fromstring stops silently on a bad token, check its count
+        # against a full split in that (rare) case and let float() raise
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', DeprecationWarning)
+            try:
+                return numpy.fromstring(block, sep=' ')
+            except (DeprecationWarning, ValueError):
+                return numpy.asarray([ float(v) for v in block.split() ])
+
+
+    def load_values(self, values):
+        """
+        Split the data values into s-parameters and noise parameters.
+
+        Parameters
+        ----------
+        values : list or numpy.ndarray
+            all numbers of the data lines, in file order
+
+        """
         # let's do some post-processing to the read values
         # for s2p parameters there may be noise parameters in the value list
         values = numpy.asarray(values)
@@ -250,12 +446,7 @@ class Touchstone:
 
         # reshape the values to match the rank
         self.sparameters = values.reshape((-1, 1 + 2*self.rank**2))
-        # multiplier from the frequency unit
-        self.frequency_mult = {'hz':1.0, 'khz':1e3,
-                               'mhz':1e6, 'ghz':1e9}.get(self.frequency_unit)
-        # set the reference to the resistance value if no [reference] is provided
-        if not self.reference:
-            self.reference = [self.resistance] * self.rank
+        self.data_loaded = True
 
 
     def get_comments(self, ignored_comments=['Created with skrf']):
@@ -382,34 +573,14 @@ class Touchstone:
             values = self.sparameters.copy()
             # use frequency in hz unit
             values[:,0] = values[:,0]*self.frequency_mult
-            if (self.format == 'db') and (format == 'ma'):
-                values[:,1::2] = 10**(values[:,1::2]/20.0)
-            elif (self.format == 'db') and (format == 'ri'):
-                v_complex = ((10**values[:,1::2]/20.0)
-                             * numpy.exp(1j*numpy.pi/180 * values[:,2::2]))
-                values[:,1::2] = numpy.real(v_complex)
-                values[:,2::2] = numpy.imag(v_complex)
-            elif (self.format == 'ma') and (format == 'db'):
-                values[:,1::2] = 20*numpy.log10(values[:,1::2])
-            elif (self.format == 'ma') and (format == 'ri'):
-                v_complex = (values[:,1::2] * numpy.exp(1j*numpy.pi/180 * values[:,2::2]))
-                values[:,1::2] = numpy.real(v_complex)
-                values[:,2::2] = numpy.imag(v_complex)
-            elif (self.format == 'ri') and (format == 'ma'):
-                v_complex = numpy.absolute(values[:,1::2] + 1j* self.sparameters[:,2::2])
-                values[:,1::2] = numpy.absolute(v_complex)
-                values[:,2::2] = numpy.angle(v_complex)*(180/numpy.pi)
-            elif (self.format == 'ri') and (format == 'db'):
-                v_complex = numpy.absolute(values[:,1::2] + 1j* self.sparameters[:,2::2])
-                values[:,1::2] = 20*numpy.log10(numpy.absolute(v_complex))
-                values[:,2::2] = numpy.angle(v_complex)*(180/numpy.pi)
+            values[:,1::2], values[:,2::2] = convert_pair(values[:,1::2], values[:,2::2],
+                                                          self.format, format)
 
         for i,n in enumerate(self.get_sparameter_names(format=format)):
             ret[n] = values[:,i]
 
         # transpose Touchstone V1 2-port files (.2p), as the order is (11) (21) (12) (22)
-        file_name_ending = self.filename.split('.')[-1].lower()
-        if self.rank == 2 and file_name_ending == "s2p":
+        if self.is_transposed():
             swaps = [ k for k in ret if '21' in k]
             for s in swaps:
                 true_s = s.replace('21', '12')
@@ -418,6 +589,119 @@ class Touchstone:
         return ret
 
 
+    def is_transposed(self):
+        """
+        Check if the s-parameter columns are stored transposed.
+
+        Touchstone V1 2-port files (.s2p) store the parameters in the
+        order (11) (21) (12) (22).
+
+        Returns
+        -------
+        status : boolean
+
+        """
+        return self.rank == 2 and self.filename.split('.')[-1].lower() == "s2p"
+
+
+    def get_frequency(self):
+        """
+        Get the frequency vector in Hz.
+
+        Computed once and shared by every caller, do not modify it.
+
+        Returns
+        -------
+        frequency : numpy.ndarray
+
+        """
+        if self._frequency is None:
+            self._frequency = self.sparameters[:,0]*self.frequency_mult
+        return self._frequency
+
+
+    def sparam(self, name, format='orig'):
+        """
+        Get the two data columns of one s-parameter in the given format.
+
+        Unlike `get_sparameter_data`, only the requested s-parameter is
+        converted, on first access, and the result is cached. In the
+        format of the file (and for 'orig') the columns are views into
+        `sparameters`, nothing is copied. The arrays are shared by every
+        caller, do not modify them.
+
+        Parameters
+        ----------
+        name : str
+          s-parameter name, as S11, S21, ... (already transposed for
+          .s2p files, as in `get_sparameter_data`)
+        format : str
+          Format: ri, ma, db, orig
+
+        Returns
+        -------
+        columns : tuple of numpy.ndarray
+            (real, imaginary), (magnitude, angle) or (dB, angle), angles
+            in degrees
+
+        Examples
+        --------
+        >>> s21_db, s21_angle = t.sparam('S21', 'db')
+
+        """
+        if format == self.format:
+            format = 'orig'
+        key = (name, format)
+        columns = self._sparam_cache.get(key)
+        if columns is None:
+            if self._sparam_columns is None:
+                self._sparam_columns = self.get_sparameter_columns()
+            col = self._sparam_columns[name]
+            values = self.sparameters
+            columns = convert_pair(values[:,col], values[:,col+1], self.format, format)
+            self._sparam_cache[key] = columns
+        return columns
+
+
+    def get_sparameter_columns(self):
+        """
+        Map the s-parameter names to their first column in `sparameters`.
+
+        Returns
+        -------
+        columns : dict
+            name (S11, S21, ...) -> column index
+
+        """
+        columns = {}
+        transposed = self.is_transposed()
+        for r1 in xrange(self.rank):
+            for r2 in xrange(self.rank):
+                i, j = (r2, r1) if transposed else (r1, r2)
+                columns["S%i%i"%(r1+1,r2+1)] = 1 + 2*(i*self.rank + j)
+        return columns
+
+
+    def nbytes(self):
+        """
+        Memory held by the parsed data and the converted columns.
+
+        Returns
+        -------
+        size : int
+            in bytes, views into `sparameters` are not counted twice
+
+        """
+        if not self.data_loaded:
+            return 0
+        total = self._sparameters.nbytes
+        for columns in self._sparam_cache.values():
+            total += sum(a.nbytes for a in columns if a.base is None)
+        if self._frequency is not None:
+            total += self._frequency.nbytes
+        return total
+
+
     def get_sparameter_arrays(self):
         """
         Returns the s-parameters as a tuple of arrays.
@@ -566,6 +850,87 @@ class Touchstone:
         """
         return self.gamma, self.z0
 
+def convert_pair(a, b, source, target):
+    '''
+    Convert s-parameter column pairs from one format to another.
+
+    Parameters
+    ----------
+    a, b : numpy.ndarray
+        real and imaginary parts, magnitude and angle (degree) or
+        log magnitude and angle (degree), as given by source
+    source : str
+        format of a and b: ri, ma or db
+    target : str
+        format to convert to: ri, ma, db, or orig for no conversion
+
+    Returns
+    -------
+    a, b : numpy.ndarray
+        the converted pair, the input arrays themselves when no conversion
+        is needed
+
+    '''
+    if target in ('orig', source):
+        return a, b
+    if source == 'db' and target == 'ma':
+        return 10**(a/20.0), b
+    if source == 'ma' and target == 'db':
+        return 20*numpy.log10(a), b
+    if target == 'ri':
+        magnitude = a if source == 'ma' else 10**(a/20.0)
+        v_complex = magnitude * numpy.exp(1j*numpy.pi/180 * b)
+        return numpy.real(v_complex), numpy.imag(v_complex)
+    # source == 'ri'
+    v_complex = a + 1j*b
+    magnitude = numpy.absolute(v_complex)
+    if target == 'db':
+        magnitude = 20*numpy.log10(magnitude)
+    return magnitude, numpy.angle(v_complex)*(180/numpy.pi)
+
+def iter_lines(text):
+    '''
+    Iterate over the lines of a text, keeping their line endings.
+
+    Parameters
+    ----------
+    text : str
+        text to split
+
+    Returns
+    -------
+    lines : iterator
+        (offset, line) tuples, offset being the position of the line in text
+
+    '''
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start) + 1 or len(text)
+        yield start, text[start:end]
+        start = end
+
+def iter_file_lines(fid):
+    '''
+    Iterate over the lines of an open file, with their positions.
+
+    Parameters
+    ----------
+    fid : file object
+        file to read from its current position
+
+    Returns
+    -------
+    lines : iterator
+        (offset, line) tuples, offset being usable with `fid.seek`
+
+    '''
+    while True:
+        offset = fid.tell()
+        line = fid.readline()
+        if not line:
+            return
+        yield offset, line
+
 def get_fid(file, *args, **kwargs):
     '''
     Return a file object, given a filename or file object.
@@ -0,0 +1,70 @@
+'''
+Range index over a family's spec sheet, used by the product search.
+
+A search keeps the products whose [low, high] spec range contains the
+requested range, for one or more dimensions (RF, LO, IF, LO drive for
+mixers, frequency for the others). For every dimension the lows and the
+highs are kept sorted, so the products with low <= requested low are a
+prefix of one order and those with high >= requested high a suffix of the
+other, both found with a binary search. The smallest of those candidate
+lists is then checked against the other bounds. When every candidate list
+is large, a NumPy boolean mask over all the products is used instead.
+'''
+
+import numpy
+
+#use the boolean mask once the best candidate list holds more than this share of the products
+MASK_FRACTION = 0.25
+
+class SpecIndex:
+
+    def __init__(self, products, dimensions):
+        self.ids = list(products)
+        self.products = products
+        self.dimensions = {}
+        for low_key, high_key in dimensions:
+            lows = numpy.array([products[id][low_key] for id in self.ids], dtype=numpy.float64)
+            highs = numpy.array([products[id][high_key] for id in self.ids], dtype=numpy.float64)
+            # products without a value never match
+            lows[numpy.isnan(lows)] = numpy.inf
+            highs[numpy.isnan(highs)] = -numpy.inf
+            low_order = numpy.argsort(lows, kind='stable')
+            high_order = numpy.argsort(highs, kind='stable')
+            self.dimensions[(low_key, high_key)] = (lows, highs,
+                                                    low_order, lows[low_order],
+                                                    high_order, highs[high_order])
+
+    #products containing every requested range, in spec sheet order
+    #ranges: {(low key, high key): (low, high)}, a None low skips the dimension
+    def search(self, ranges):
+        ranges = {dim: r for dim, r in ranges.items() if r[0] != None}
+        if len(ranges) == 0:
+            return [self.products[id] for id in self.ids]
+
+        # smallest candidate list over all bounds
+        best = None
+        for dim, (low, high) in ranges.items():
+            lows, highs, low_order, sorted_lows, high_order, sorted_highs = self.dimensions[dim]
+            count = numpy.searchsorted(sorted_lows, low, side='right')
+            if best is None or count < len(best):
+                best = low_order[:count]
+            start = numpy.searchsorted(sorted_highs, high, side='left')
+            if len(self.ids) - start < len(best):
+                best = high_order[start:]
+
+        if len(best) > MASK_FRACTION * len(self.ids):
+            return self.search_mask(ranges)
+
+        keep = numpy.ones(len(best), dtype=bool)
+        for dim, (low, high) in ranges.items():
+            lows, highs = self.dimensions[dim][:2]
+            keep &= (lows[best] <= low) & (high <= highs[best])
+        return [self.products[self.ids[i]] for i in numpy.sort(best[keep])]
+
+    #same as search, testing every product at once
+    def search_mask(self, ranges):
+        keep = numpy.ones(len(self.ids), dtype=bool)
+        for dim, (low, high) in ranges.items():
+            lows, highs = self.dimensions[dim][:2]
+            keep &= (lows <= low) & (high <= highs)
+        return [self.products[self.ids[i]] for i in numpy.flatnonzero(keep)]
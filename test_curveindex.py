@@ -0,0 +1,64 @@
+'''
+Windowed statistics of CurveIndex and Product.batch_ystats against
+numpy.nanmin/nanmax/nanmedian over the points of the window, on random
+curves with blank (NaN) values, repeated frequencies and empty windows.
+
+    python -m pytest -q test_curveindex.py
+'''
+
+import numpy
+import pytest
+from curve import Curve
+from curveindex import CurveIndex
+from product import Product
+
+#min, max and median of the y values with xlow <= x <= xhigh, ignoring NaN, None if there are none
+def reference_stats(x, y, xlow, xhigh):
+    values = y[(x >= xlow) & (x <= xhigh) & ~numpy.isnan(y)]
+    if len(values) == 0:
+        return None
+    return float(numpy.nanmin(values)), float(numpy.nanmax(values)), float(numpy.nanmedian(values))
+
+#a random curve: frequencies with repeats, some of them blank, and values with NaN
+def random_curve(rng):
+    n = int(rng.integers(0, 300))
+    x = numpy.round(rng.uniform(0, 20, n), 1)
+    y = numpy.round(rng.normal(0, 5, n), 2)
+    y[rng.random(n) < 0.1] = numpy.nan
+    x[rng.random(n) < 0.02] = numpy.nan
+    return x, y
+
+#a product holding the given lines of a graph, no product files are needed
+def product_with(graph, lines):
+    p = Product('test')
+    p.data[graph] = {label : Curve(x, y) for label, (x, y) in lines.items()}
+    p.linekeys[graph] = list(lines)
+    return p
+
+@pytest.mark.parametrize('seed', range(10))
+def test_stats_match_nan_reference(seed):
+    rng = numpy.random.default_rng(seed)
+    for i in range(30):
+        x, y = random_curve(rng)
+        index = CurveIndex(x, y)
+        for j in range(10):
+            xlow, xhigh = numpy.sort(rng.uniform(-1, 21, 2))
+            assert index.stats(xlow, xhigh) == pytest.approx(reference_stats(x, y, xlow, xhigh))
+
+def test_all_nan_window():
+    index = CurveIndex([1, 2, 3, 4], [numpy.nan, numpy.nan, 5, 6])
+    assert index.stats(0, 2.5) is None
+    assert index.stats(0, 3) == (5, 5, 5)
+    assert index.stats(0, 10) == (5, 6, 5.5)
+
+def test_batch_ystats_match_nan_reference():
+    rng = numpy.random.default_rng(0)
+    curves = [[random_curve(rng) for line in range(int(rng.integers(0, 3)))] for i in range(20)]
+    products = [product_with('g', {'line %i' % k : curve for k, curve in enumerate(lines)}) for lines in curves]
+    for xlow, xhigh in ((0, 20), (4, 6), (30, 40)):
+        got = Product.batch_ystats(products, 'g', xlow, xhigh)
+        for lines, stats in zip(curves, got):
+            first = reference_stats(*lines[0], xlow, xhigh) if lines else None
+            second = reference_stats(*lines[1], xlow, xhigh) if len(lines) == 2 and first else None
+            expected = (first or (None,) * 3) + (second or (None,) * 3)
+            assert stats == pytest.approx(expected)
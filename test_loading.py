@@ -0,0 +1,133 @@
+'''
+Tests of the prefetcher and of the concurrent loads of loading.py, with
+stand-in loads that finish at once, fail or hang.
+
+    python -m pytest -q test_loading.py
+'''
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import loading
+from cache import SingleFlight
+
+#a product whose graph loads only record that they ran
+class FakeProduct:
+
+    def __init__(self, name):
+        self.name = name
+        self.linekeys = {}
+        self.loads = []
+
+    def fetch_graphs(self, graphs):
+        graphs = [graph for graph in graphs if graph not in self.linekeys]
+        if graphs:
+            self.loads.append(graphs)
+        for graph in graphs:
+            self.linekeys[graph] = []
+        return {}
+
+#run fn on a thread, fail the test if it has not returned within timeout seconds
+def finishes(fn, timeout=5):
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+def test_prefetch_of_loads_already_done():
+    prefetcher = loading.Prefetcher(2)
+    products = [FakeProduct('p%i' % i) for i in range(20)]
+
+    # loads done before prefetch registers their callbacks run them on the calling thread
+    def run():
+        for i in range(20):
+            prefetcher.prefetch(products, ['g%i' % i], owner='session')
+    assert finishes(run)
+    prefetcher.pool.shutdown(wait=True)
+
+    assert finishes(lambda: prefetcher.cancel('session'))
+    assert prefetcher.inflight == {}
+    assert prefetcher.owners == {}
+    assert all(p.loads == [['g%i' % i] for i in range(20)] for p in products)
+
+def test_prefetch_loads_graphs_of_a_product_together():
+    prefetcher = loading.Prefetcher(1)
+    release = threading.Event()
+    blocker = FakeProduct('blocker')
+    blocker.fetch_graphs = lambda graphs: release.wait()
+    prefetcher.prefetch([blocker], ['g'])
+    products = [FakeProduct('p%i' % i) for i in range(3)]
+    prefetcher.prefetch(products, ['a', 'b', 'c'], owner='session')
+
+    # a queued load is taken over by the foreground, for all its graphs at once
+    assert prefetcher.wait(products[0], ['a', 'b']) == {}
+    assert products[0].loads == [['a', 'b']]
+    # the other session's cancel leaves the loads alone, this one's drops them
+    prefetcher.cancel('other')
+    assert len(prefetcher.inflight) == 1 + 6
+    prefetcher.cancel('session')
+    release.set()
+    prefetcher.pool.shutdown(wait=True)
+    assert products[1].loads == [] and products[2].loads == []
+    assert prefetcher.inflight == {}
+
+def test_load_all_deadline_with_hung_loads(monkeypatch):
+    monkeypatch.setattr(loading, 'LOAD_POOL', ThreadPoolExecutor(2))
+    release = threading.Event()
+
+    # the first two loads hold both threads, the others never start
+    def task(item):
+        if item < 2:
+            release.wait()
+        return item
+
+    start = time.monotonic()
+    try:
+        results = loading.load_all(task, range(6), timeout=0.5)
+    finally:
+        release.set()
+    assert results == []
+    assert time.monotonic() - start < 1.5
+
+def test_load_all_keeps_order_and_skips_failures():
+    def task(item):
+        if item == 3:
+            raise ValueError()
+        return item * 2
+    assert loading.load_all(task, range(6), timeout=5) == [(0, 0), (1, 2), (2, 4), (4, 8), (5, 10)]
+
+def test_single_flight_waiter_timeout():
+    flight = SingleFlight(timeout=0.2)
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do('key', release.wait), daemon=True)
+    leader.start()
+    while not len(flight):
+        pass
+    with pytest.raises(TimeoutError):
+        flight.do('key', lambda: 'not run')
+    release.set()
+    leader.join()
+    assert flight.do('key', lambda: 'run') == 'run'
+
+def test_single_flight_do_many_shares_keys_in_flight():
+    flight = SingleFlight(timeout=5)
+    release = threading.Event()
+    runs = []
+
+    def load(keys):
+        runs.append(list(keys))
+        if 'a' in keys:
+            release.wait()
+        return {key : key.upper() for key in keys if key != 'c'}, {'c' : ValueError()} if 'c' in keys else {}
+
+    leader = threading.Thread(target=lambda: flight.do_many(['a', 'b'], load), daemon=True)
+    leader.start()
+    while len(flight) < 2:
+        pass
+    threading.Timer(0.1, release.set).start()
+    results, errors = flight.do_many(['b', 'c'], load)
+    leader.join()
+    assert runs == [['a', 'b'], ['c']]
+    assert results == {'b' : 'B'}
+    assert list(errors) == ['c']
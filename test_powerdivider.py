@@ -0,0 +1,87 @@
+'''
+Property test of PowerDivider.handle_outliers against the per-point loop it
+replaced, kept here as the reference.
+
+    python -m pytest -q test_powerdivider.py
+'''
+
+import numpy
+import pytest
+from powerdivider import PowerDivider
+
+#the original filter: a point is kept when its step from the last kept point
+#differs by less than 1 from the step between the two points kept before it
+def reference_outliers(xdata, ydata):
+    xreturn = []
+    yreturn = []
+
+    prev, prev_diff = None, None
+
+    for i in range(len(xdata)):
+        yval = ydata[i]
+        xval = xdata[i]
+
+        if prev == None:
+            prev = yval
+            prev_diff = None
+            yreturn.append(yval)
+            xreturn.append(xval)
+        elif prev_diff == None:
+            prev_diff = yval - prev
+            prev = yval
+            yreturn.append(yval)
+            xreturn.append(xval)
+        elif abs(prev_diff - (yval - prev)) < 1:
+            prev_diff = yval - prev
+            prev = yval
+            yreturn.append(yval)
+            xreturn.append(xval)
+
+    return xreturn, yreturn
+
+#a random balance curve: drift (smooth or in whole steps) with spikes, steps of exactly 1, NaN and 360 degree wraps
+def random_curve(rng):
+    n = int(rng.integers(0, 400))
+    x = numpy.sort(rng.uniform(0, 40, n))
+    if rng.random() < 0.3:
+        # whole dB steps, many second differences are exactly 1
+        y = numpy.cumsum(rng.integers(-2, 3, n)).astype(numpy.float64)
+    else:
+        y = numpy.cumsum(rng.normal(0, rng.choice([0.05, 0.3, 1]), n))
+    for name, rate in (('spikes', 0.05), ('nans', 0.02), ('ties', 0.02), ('wraps', 0.01)):
+        picks = rng.random(n) < rate
+        if name == 'spikes':
+            y[picks] += rng.normal(0, 20, picks.sum())
+        elif name == 'nans':
+            y[picks] = numpy.nan
+        elif name == 'ties':
+            y[picks] = numpy.roll(y, 1)[picks] + 1
+        else:
+            y[numpy.cumsum(picks) % 2 == 1] -= 360
+    return x, y
+
+@pytest.fixture
+def divider():
+    # handle_outliers only uses its arguments, no product files are needed
+    return PowerDivider.__new__(PowerDivider)
+
+@pytest.mark.parametrize('unwrap', [False, True])
+@pytest.mark.parametrize('seed', range(20))
+def test_handle_outliers_matches_reference(divider, seed, unwrap):
+    rng = numpy.random.default_rng(seed)
+    for i in range(50):
+        x, y = random_curve(rng)
+        expected_y = numpy.degrees(numpy.unwrap(numpy.radians(y))) if unwrap else y
+        expected = reference_outliers(x, expected_y)
+        got = divider.handle_outliers(x, y, unwrap)
+        assert numpy.array_equal(got[0], numpy.array(expected[0]))
+        assert numpy.array_equal(got[1], numpy.array(expected[1], dtype=numpy.float64), equal_nan=True)
+
+def test_handle_outliers_short_curves(divider):
+    for n in range(4):
+        x = numpy.arange(n, dtype=numpy.float64)
+        y = numpy.array([0, 5, 50, 51][:n], dtype=numpy.float64)
+        expected = reference_outliers(x, y)
+        got = divider.handle_outliers(x, y)
+        assert got[0].tolist() == expected[0]
+        assert got[1].tolist() == expected[1]
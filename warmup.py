@@ -0,0 +1,100 @@
+'''
+Parallel warm-up of every product family.
+
+Loads every graph of every product in a pool of processes, then rebuilds the
+product objects in this process from the results, so no request has to read
+an excel or touchstone file. Run before gunicorn forks its workers (--preload)
+the loaded objects are inherited, copy-on-write, by every worker:
+
+    PRODUCTSEARCH_WARMUP=1 gunicorn --preload productsearch:server
+    python productsearch.py --warmup
+
+Graphs found in the catalog or the shared store are memory-mapped files, the
+pool only reports them and they are mapped again here instead of being
+copied between processes. The families' spec sheets are loaded (from the
+catalog when it is fresh) before the pool starts, the tasks need them.
+
+Only the products that fit in the object cache budget are kept (memory-mapped
+graphs count for nothing), the loads still queued once it is full are
+cancelled and the number of products kept is printed.
+'''
+
+import os
+import numpy
+from concurrent.futures import ProcessPoolExecutor
+from mixer import Mixer
+from amplifier import Amplifier
+from powerdivider import PowerDivider
+from coupler import Coupler
+from balun import Balun
+
+FAMILIES = {family.__name__ : family for family in (Mixer, Amplifier, PowerDivider, Coupler, Balun)}
+
+#True if the warm-up was asked for with the environment or the command line
+def requested(argv):
+    return os.environ.get('PRODUCTSEARCH_WARMUP', '') not in ('', '0') or '--warmup' in argv
+
+#load every graph of a product (runs in a pool process)
+#returns graph -> (linekeys, data, indexes, stamp), or None for memory-mapped graphs, None if the product can't be built
+def load_product(family_name, id):
+    family = FAMILIES[family_name]
+    family.load_class_vars()
+    try:
+        product = family(id)
+    except Exception:
+        return None
+
+    graphs = {}
+    errors = product.fetch_graphs(family.graph_options)
+    for graph in family.graph_options:
+        if graph in errors or graph not in product.linekeys:
+            continue
+        data = product.data[graph]
+        if any(isinstance(line.x, numpy.memmap) for line in data.values()):
+            graphs[graph] = None
+        else:
+            indexes = {label : product.indexes[(graph, label)] for label in data if (graph, label) in product.indexes}
+            graphs[graph] = (product.linekeys[graph], data, indexes, product.stamps.get(graph))
+    return graphs
+
+#load the products of every family, until they hold budget bytes, returns the loaded product objects
+def warm(budget=None, workers=None):
+    for family in FAMILIES.values():
+        family.load_class_vars()
+
+    products = []
+    size = 0
+    full = False
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [(family, id, pool.submit(load_product, name, id))
+                   for name, family in FAMILIES.items() for id in family.products]
+        for family, id, future in futures:
+            if full:
+                future.cancel()
+                continue
+            try:
+                graphs = future.result()
+            except Exception:
+                continue
+            if graphs is None:
+                continue
+            product = family(id)
+            product.fetch_graphs([graph for graph, loaded in graphs.items() if loaded is None])
+            for graph, loaded in graphs.items():
+                if loaded is None:
+                    continue
+                linekeys, data, indexes, stamp = loaded
+                product.data[graph] = data
+                for label, index in indexes.items():
+                    product.indexes[(graph, label)] = index
+                product.stamps[graph] = stamp
+                product.linekeys[graph] = linekeys
+            if budget is not None and size + product.nbytes() > budget:
+                # the cache would evict the first products to make room, stop here
+                full = True
+                continue
+            size += product.nbytes()
+            products.append(product)
+    print('warm-up kept %i of %i products (%.1f MB)' % (len(products), len(futures), size / 2**20)
+          + (', object cache budget reached' if full else ''))
+    return products